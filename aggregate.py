@@ -0,0 +1,219 @@
+"""
+incremental aggregation of every source's list.
+
+rebuilding the combined list means recounting every list, even when only one of them changed.
+Aggregate keeps each source's contribution (which movies it has, and at what rank) separately
+alongside the running totals, and saves all of it to disk. when a source's list changes, only the
+movies that were added, dropped or moved get their totals touched, and the sorted rankings are
+patched in place instead of being re-sorted.
+
+the totals kept per movie are:
+    count    how many lists it's on
+    borda    sum of (list length - rank + 1) / list length (see ranking.borda). like there, a
+             list's length is its last rank, so a movie named twice doesn't shorten it
+    mrr      sum of 1 / rank (divide by the number of sources for the mean)
+"""
+import bisect
+import json
+import os
+
+from store import atomic_write
+
+# where the aggregate state lives between runs
+aggregate_path = 'data/aggregate.json'
+
+# the totals we keep for every movie
+totals_kept = ['count', 'borda', 'mrr']
+# bump when the totals are worked out differently; a saved aggregate from before gets recounted
+# from its sources on load
+totals_version = 2
+
+
+def list_length(ranks):
+    '''
+    a list's length for borda points: its last rank, however many movies it named twice before it
+    '''
+    return max(ranks.values(), default=0)
+
+
+def contribution(rank, length):
+    '''
+    what being at rank on a list of length adds to each total
+    '''
+    return {
+        'count': 1,
+        'borda': (length - rank + 1) / length,
+        'mrr': 1 / rank
+    }
+
+
+class Aggregate:
+    '''
+    per-source contributions plus running totals, updated one source at a time
+    '''
+
+    def __init__(self, path=aggregate_path):
+        self.path = path
+        # source -> {movie: rank}
+        self.sources = {}
+        # movie -> {total: value}
+        self.totals = {}
+        # total -> sorted list of (-value, movie), built the first time it's asked for
+        self._sorted = {}
+        # movies whose totals changed since the last take_changed()
+        self.changed = set()
+        # whether the saved totals were out of date and got recounted on load
+        self.recounted = False
+        if os.path.exists(path):
+            with open(path, 'r') as aggregate_file:
+                state = json.loads(aggregate_file.read())
+            self.sources = state['sources']
+            self.totals = state['totals']
+            if state.get('version') != totals_version:
+                self.recount()
+                # so it gets saved even if no source changes this run
+                self.recounted = True
+
+    def recount(self):
+        '''
+        work every total out again from the sources' lists
+        '''
+        self.totals = {}
+        self._sorted = {}
+        for ranks in self.sources.values():
+            length = list_length(ranks)
+            for movie, rank in ranks.items():
+                self._apply(movie, contribution(rank, length))
+
+    def update_source(self, source, movies):
+        '''
+        replace a source's list with movies (canonical titles, best first) and patch the totals.
+        returns how many movies' totals changed
+        '''
+        new = {}
+        for rank, movie in enumerate(movies, 1):
+            # a list that names a movie twice only counts its best spot
+            new.setdefault(movie, rank)
+        old = self.sources.get(source, {})
+        old_length = list_length(old)
+        new_length = list_length(new)
+        if old_length == new_length:
+            # same length, so only the movies that were added, dropped or moved are affected
+            changed = {movie for movie in old.keys() | new.keys() if old.get(movie) != new.get(movie)}
+        else:
+            # borda points depend on the list length, so every movie on the list shifts a little
+            changed = old.keys() | new.keys()
+        for movie in changed:
+            delta = dict.fromkeys(totals_kept, 0)
+            if movie in old:
+                for total, value in contribution(old[movie], old_length).items():
+                    delta[total] -= value
+            if movie in new:
+                for total, value in contribution(new[movie], new_length).items():
+                    delta[total] += value
+            self._apply(movie, delta)
+        if new:
+            self.sources[source] = new
+        else:
+            self.sources.pop(source, None)
+        return len(changed)
+
+    def remove_source(self, source):
+        '''
+        take a source out of the totals completely
+        '''
+        return self.update_source(source, [])
+
+    def _apply(self, movie, delta):
+        old_totals = self.totals.get(movie)
+        new_totals = dict(old_totals or dict.fromkeys(totals_kept, 0))
+        for total, value in delta.items():
+            new_totals[total] += value
+        self.changed.add(movie)
+        if new_totals['count'] <= 0:
+            # it isn't on any list anymore
+            new_totals = None
+            self.totals.pop(movie, None)
+        else:
+            self.totals[movie] = new_totals
+        # patch the sorted rankings we've already built
+        for total, ranking in self._sorted.items():
+            if old_totals is not None:
+                del ranking[bisect.bisect_left(ranking, (-old_totals[total], movie))]
+            if new_totals is not None:
+                bisect.insort(ranking, (-new_totals[total], movie))
+
+    def ranking(self, total='count', top=None):
+        '''
+        (movie, value) pairs, best first, for one of the totals.
+        mrr is divided by the number of sources here, so it's the actual mean
+        '''
+        if total not in self._sorted:
+            self._sorted[total] = sorted((-values[total], movie) for movie, values in self.totals.items())
+        ranking = self._sorted[total]
+        if top is not None:
+            ranking = ranking[:top]
+        if total == 'mrr' and self.sources:
+            return [(movie, -value / len(self.sources)) for value, movie in ranking]
+        # the other totals come back exactly as they were stored (counts stay ints)
+        return [(movie, -value) for value, movie in ranking]
+
+    def take_changed(self):
+        '''
+        the movies whose totals changed since the last call
+        '''
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def counts(self):
+        '''
+        movie -> how many lists it's on
+        '''
+        return {movie: values['count'] for movie, values in self.totals.items()}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write(self.path, json.dumps({'version': totals_version, 'sources': self.sources,
+                                          'totals': self.totals}))
+
+
+if __name__ == "__main__":
+    # patching the totals one source at a time has to end up where recounting from scratch does,
+    # lists that name a movie twice included
+    import random
+
+    # never saved, so any path that doesn't exist will do
+    missing = os.path.join(os.path.dirname(aggregate_path), '.self-check')
+    rng = random.Random(0)
+    pool = [f'movie {i}' for i in range(40)]
+    patched = Aggregate(path=missing)
+    lists = {}
+    failed = 0
+    for step in range(500):
+        source = f'source {rng.randrange(5)}'
+        lists[source] = [rng.choice(pool) for _ in range(rng.randrange(12))]
+        patched.update_source(source, lists[source])
+        rebuilt = Aggregate(path=missing)
+        for name, movies in lists.items():
+            rebuilt.update_source(name, movies)
+        mismatched = [
+            movie for movie in patched.totals.keys() | rebuilt.totals.keys()
+            if movie not in patched.totals or movie not in rebuilt.totals
+            or any(abs(patched.totals[movie][total] - rebuilt.totals[movie][total]) > 1e-9
+                   for total in totals_kept)
+        ]
+        recounted = Aggregate(path=missing)
+        recounted.sources = {name: dict(ranks) for name, ranks in patched.sources.items()}
+        recounted.recount()
+        mismatched += [
+            movie for movie in rebuilt.totals
+            if any(abs(recounted.totals[movie][total] - rebuilt.totals[movie][total]) > 1e-9
+                   for total in totals_kept)
+        ]
+        negative = [movie for movie, values in patched.totals.items() if values['borda'] <= 0]
+        if mismatched or negative:
+            failed += 1
+            print(f'step {step}: {len(mismatched)} totals off from a rebuild, {len(negative)} not positive')
+    print(f'{failed} of 500 failed')
@@ -0,0 +1,47 @@
+"""
+shared bits for the benchmark scripts
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+
+# the repo root, so the benchmarks can import list-maker's modules no matter where they're run from
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root not in sys.path:
+    sys.path.insert(0, root)
+
+from fixture_server import fixtures_dir  # noqa: E402
+from store import JsonBackend, MovieStore  # noqa: E402
+
+
+def load_list_maker():
+    '''
+    import list-maker.py (the dash in the name means a plain import won't work).
+    its movie store is swapped for a throwaway one so benchmarks never touch data/movies
+    '''
+    spec = importlib.util.spec_from_file_location('list_maker', os.path.join(root, 'list-maker.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.movie_store = MovieStore(JsonBackend(tempfile.mkdtemp(prefix='list-maker-bench-')))
+    return module
+
+
+def fixture_path(name, directory=None):
+    '''
+    where the saved page for a source lives
+    '''
+    return os.path.join(directory or os.path.join(root, fixtures_dir), f'{name}.html')
+
+
+def load_fixtures(names, directory=None):
+    '''
+    read every saved page that exists. returns name -> bytes, skipping sources with no fixture
+    '''
+    pages = {}
+    for name in names:
+        path = fixture_path(name, directory)
+        if os.path.exists(path):
+            with open(path, 'rb') as page_file:
+                pages[name] = page_file.read()
+    return pages
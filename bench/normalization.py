@@ -0,0 +1,90 @@
+"""
+micro-benchmark for the per-item normalization helpers.
+
+times the way the parsers used to do each step (building the translation 'nary on every call,
+passing the raw pattern string to re.findall on every item, capwords every time) against the
+shared helpers in normalize.py, over a big synthetic list where titles repeat like they do
+across real lists.
+
+usage: python bench/normalization.py [items]
+"""
+import random
+import re
+import sys
+import time
+from string import capwords
+
+import common  # noqa: F401 (puts the repo root on the path)
+
+from normalize import find_year, illegal_chars, parse_votes, slugify, title_case
+
+
+def old_slugify(movie_title):
+    filename = movie_title.translate({ord(c): None for c in illegal_chars})
+    filename = filename.replace('  ', ' ')
+    filename = filename.replace(' ', '_')
+    return filename.lower() + '.json'
+
+
+def old_votes(text, rating):
+    text = text.replace(str(rating), '')
+    found = re.findall(r'(?:^|\s)(\d*\.?\d+|\d{1,3}(?:,\d{3})*(?:\.\d+)?)(?!\S)', text)[0]
+    return int(found.replace(',', ''))
+
+
+def old_year(text):
+    return re.findall(r'(\([12]\d{3}\))', text)[0]
+
+
+def synthetic(items, distinct=2000, seed=0):
+    '''
+    items rows of (title, votes tooltip, rating, ranker description), drawn from distinct movies
+    '''
+    rng = random.Random(seed)
+    movies = []
+    for i in range(distinct):
+        year = rng.randint(1920, 2020)
+        rating = round(rng.uniform(5, 9.5), 1)
+        votes = f'{rng.randint(1000, 2500000):,}'
+        movies.append((
+            f"The Movie: Part {i}, Director's Cut ({year})",
+            f'{rating} base on {votes} votes',
+            rating,
+            f'Starring someone and someone else ({year}) Directed by somebody'
+        ))
+    return [movies[rng.randrange(distinct)] for _ in range(items)]
+
+
+def per_item(func, args_list):
+    '''
+    nanoseconds per call of func over every args tuple
+    '''
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e9
+
+
+def main(items=200000):
+    rows = synthetic(items)
+    titles = [(row[0],) for row in rows]
+    votes = [(row[1], row[2]) for row in rows]
+    descs = [(row[3],) for row in rows]
+    cases = [
+        ('slugify', old_slugify, slugify, titles),
+        ('imdb votes', old_votes, parse_votes, votes),
+        ('ranker year', old_year, find_year, descs),
+        ('capwords', capwords, title_case, titles),
+    ]
+    print(f'{items} items')
+    print(f'{"step":>14}{"before":>14}{"after":>14}{"speedup":>10}')
+    for name, before, after, args_list in cases:
+        # make sure both versions agree before timing them
+        assert all(before(*args) == after(*args) for args in args_list[:1000])
+        old_ns = per_item(before, args_list)
+        new_ns = per_item(after, args_list)
+        print(f'{name:>14}{old_ns:>11.0f} ns{new_ns:>11.0f} ns{old_ns / new_ns:>9.1f}x')
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
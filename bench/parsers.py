@@ -0,0 +1,54 @@
+"""
+how much faster is each parser with lxml and targeted (strained) parsing?
+
+runs every parser over its saved fixture page with:
+    html.parser, whole page   (how the parsers used to work)
+    html.parser, strained
+    lxml, strained            (only if lxml is installed)
+
+usage: python bench/parsers.py [repeats]
+"""
+import sys
+import time
+
+from common import load_fixtures
+
+import parsing
+from sources import registry, run_parser
+
+
+def time_parser(name, page, repeats):
+    '''
+    best-of-repeats seconds for one parse of page
+    '''
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run_parser(name, page)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(repeats=5):
+    pages = load_fixtures(registry)
+    if not pages:
+        print('no fixtures found, record them first with bench/record.py')
+        return
+    configs = [('html.parser', False), ('html.parser', True)]
+    if parsing.fast_backend:
+        configs.append((parsing.fast_backend, True))
+    header = ['source'] + [f'{backend}{" strained" if strain else ""}' for backend, strain in configs]
+    print(''.join(f'{h:>24}' for h in header) + f'{"speedup":>10}')
+    for name, page in pages.items():
+        timings = []
+        for backend, strain in configs:
+            parsing.backend = backend
+            parsing.strain = strain
+            timings.append(time_parser(name, page, repeats))
+        row = [name] + [f'{t * 1000:.1f} ms' for t in timings]
+        print(''.join(f'{cell:>24}' for cell in row) + f'{timings[0] / timings[-1]:>9.1f}x')
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
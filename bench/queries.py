@@ -0,0 +1,100 @@
+"""
+load test for the query service.
+
+starts query.py's http service on a free port (over whatever's in data/ right now), then fires a
+mix of requests at it from a bunch of threads and reports p50/p99 latency per kind of request.
+
+usage: python bench/queries.py [--requests 2000] [--threads 16] [--data data_dir]
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from urllib.request import urlopen
+
+from common import root
+
+from aggregate import aggregate_path
+from query import QueryApi, serve
+from snapshot import snapshot_path
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def request_mix(api):
+    '''
+    (kind, path) pairs covering every endpoint, built from what's actually in the index
+    '''
+    index = api.refresh()
+    titles = index.orders['count'][:500]
+    sources = sorted(index.source_lists)
+    years = index.sorted_years
+    mix = [
+        ('ranking', lambda: '/ranking?top=100'),
+        ('ranking borda', lambda: '/ranking?total=borda&top=100'),
+        ('ranking min_lists', lambda: '/ranking?min_lists=2&top=100'),
+        ('sources', lambda: '/sources'),
+    ]
+    if titles:
+        mix.append(('movie', lambda: '/movie?title=' + quote(random.choice(titles))))
+    if sources:
+        mix.append(('source list', lambda: '/sources/' + random.choice(sources)))
+        mix.append(('ranking by source', lambda: '/ranking?source=' + random.choice(sources)))
+    if years:
+        def by_decade():
+            start = random.choice(years) // 10 * 10
+            return f'/ranking?year_from={start}&year_to={start + 9}&top=50'
+        mix.append(('ranking by decade', by_decade))
+    return mix
+
+
+def run(requests, threads, data_dir):
+    # the default paths are relative to the repo's data/, so point them at data_dir instead
+    api = QueryApi(os.path.join(data_dir, os.path.relpath(aggregate_path, 'data')),
+                   os.path.join(data_dir, os.path.relpath(snapshot_path, 'data')))
+    server, base_url = serve(api, port=0)
+    mix = request_mix(api)
+    jobs = [random.choice(mix) for _ in range(requests)]
+    jobs = [(kind, make_path()) for kind, make_path in jobs]
+
+    def hit(job):
+        kind, path = job
+        start = time.perf_counter()
+        with urlopen(base_url + path) as response:
+            response.read()
+        return kind, time.perf_counter() - start
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            timings = list(pool.map(hit, jobs))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    by_kind = {}
+    for kind, seconds in timings:
+        by_kind.setdefault(kind, []).append(seconds)
+    by_kind['all'] = [seconds for _, seconds in timings]
+    print(f'{requests} requests on {threads} threads in {elapsed:.2f}s ({requests / elapsed:.0f} req/s)')
+    print(f'{"request":>20}{"count":>8}{"p50":>10}{"p99":>10}')
+    for kind, values in by_kind.items():
+        values.sort()
+        print(f'{kind:>20}{len(values):>8}{percentile(values, 0.5) * 1000:>8.2f}ms'
+              f'{percentile(values, 0.99) * 1000:>8.2f}ms')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='p50/p99 latency of the query service')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--data', default=os.path.join(root, 'data'),
+                        help='the data directory to serve (default: the repo\'s data/)')
+    args = parser.parse_args()
+    run(args.requests, args.threads, args.data)
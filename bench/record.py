@@ -0,0 +1,40 @@
+"""
+download every source page once and save it as a fixture, so the benchmarks (and the fixture
+server) can run without touching the network again.
+
+usage: python bench/record.py [source ...]     (records every source by default)
+"""
+import os
+import sys
+
+from common import fixture_path
+
+from fetcher import fetch_all
+from fixture_server import fixtures_dir
+from sources import registry
+from store import atomic_write
+
+
+def record(names=None, directory=None):
+    '''
+    save each source's page to the fixtures directory. returns the names that were saved
+    '''
+    if not names:
+        names = list(registry)
+    jobs = {name: (registry[name].url, registry[name].headers) for name in names}
+    saved = []
+    for name, page, error in fetch_all(jobs):
+        if error is not None:
+            print(f'could not record {name}: {error}')
+            continue
+        path = fixture_path(name, directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, page)
+        print(f'recorded {name} ({len(page)} bytes)')
+        saved.append(name)
+    return saved
+
+
+if __name__ == "__main__":
+    saved = record(sys.argv[1:])
+    print(f'{len(saved)} fixtures saved to {fixtures_dir}')
@@ -0,0 +1,181 @@
+"""
+offline, per-stage benchmark of a full list-maker run.
+
+every source is served from its recorded fixture (see record.py) by the local fixture server, then
+for each one we time:
+    fetch      downloading the page from the stand-in
+    parse      building the soup
+    normalize  everything else the parser does (pulling out titles, ranks, ratings)
+    merge      merging the parsed records into the lists and the store
+    persist    flushing the store to disk
+along with the peak memory of the fetch, the parser and the flush.
+
+results are written as json so runs on different commits can be compared:
+    python bench/stages.py                              writes bench/results/<commit>.json
+    python bench/stages.py --compare bench/results/abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from common import load_fixtures, load_list_maker, root
+
+import parsing
+import sources
+from fetcher import fetch
+from fixture_server import fixtures_dir, serve_fixtures
+from store import atomic_write
+
+results_dir = os.path.join(root, 'bench', 'results')
+
+# the stages we report, in order
+stages = ['fetch', 'parse', 'normalize', 'merge', 'persist']
+
+
+class Timer:
+    '''
+    wraps a function and adds up how long all its calls take
+    '''
+
+    def __init__(self, func):
+        self.func = func
+        self.total = 0.0
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.total += time.perf_counter() - start
+            self.calls += 1
+
+
+def measure(func, *args):
+    '''
+    run func, returning (result, seconds, peak bytes allocated while it ran)
+    '''
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - before
+    return result, elapsed, peak
+
+
+def bench_source(lm, name, url):
+    '''
+    run one source through every stage and return its numbers
+    '''
+    site_list = lm.site_lists[name]
+    del site_list[:]
+    # swap in a timed version of the soup maker so it can be split out of the parser
+    soup_timer = sources.make_soup = Timer(parsing.make_soup)
+    try:
+        page, fetch_s, fetch_peak = measure(fetch, url)
+        records, parser_s, parse_peak = measure(sources.run_parser, name, page)
+    finally:
+        sources.make_soup = parsing.make_soup
+    _, merge_s, _ = measure(lm.merge_records, name, records)
+    written, persist_s, persist_peak = measure(lm.movie_store.flush)
+    return {
+        'bytes': len(page),
+        'items': len(site_list),
+        'files_written': written,
+        'fetch': fetch_s,
+        'parse': soup_timer.total,
+        'normalize': parser_s - soup_timer.total,
+        'merge': merge_s,
+        'persist': persist_s,
+        'peak_bytes': {
+            'fetch': fetch_peak,
+            'parse': parse_peak,
+            'persist': persist_peak
+        }
+    }
+
+
+def warm_up(pages):
+    '''
+    import bs4 (and lxml under it) and parse one page, untimed. both happen on the first parse
+    otherwise, and would land in whichever source happens to be benchmarked first
+    '''
+    import bs4  # noqa: F401
+
+    name, page = next(iter(pages.items()))
+    sources.run_parser(name, page)
+
+
+def current_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run():
+    lm = load_list_maker()
+    pages = load_fixtures(sources.registry)
+    names = list(pages)
+    if pages:
+        warm_up(pages)
+    server, base_url = serve_fixtures(os.path.join(root, fixtures_dir))
+    tracemalloc.start()
+    try:
+        results = {
+            name: bench_source(lm, name, f'{base_url}/{name}.html')
+            for name in names
+        }
+    finally:
+        tracemalloc.stop()
+        server.shutdown()
+    return {
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'backend': parsing.backend or parsing.fast_backend or 'html.parser',
+        'created': time.time(),
+        'sources': results
+    }
+
+
+def print_report(report, baseline=None):
+    print(f'commit {report["commit"]}, {report["backend"]}')
+    print(f'{"source":>20}' + ''.join(f'{stage:>18}' for stage in stages) + f'{"peak":>12}')
+    for name, result in report['sources'].items():
+        row = f'{name:>20}'
+        for stage in stages:
+            cell = f'{result[stage] * 1000:.1f}ms'
+            old = baseline['sources'].get(name) if baseline else None
+            if old and old[stage]:
+                cell += f' {result[stage] / old[stage]:.2f}x'
+            row += f'{cell:>18}'
+        peak = max(result['peak_bytes'].values())
+        print(row + f'{peak / 1024:>10.0f}kB')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='per-stage benchmark over recorded fixtures')
+    parser.add_argument('--compare', help='results json from an earlier run to compare against')
+    parser.add_argument('--output', help='where to write the results (default bench/results/<commit>.json)')
+    args = parser.parse_args()
+
+    report = run()
+    if not report['sources']:
+        print('no fixtures found, record them first with bench/record.py')
+        raise SystemExit(1)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            baseline = json.loads(baseline_file.read())
+    print_report(report, baseline)
+    output = args.output or os.path.join(results_dir, f'{report["commit"]}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    atomic_write(output, json.dumps(report, indent=2))
+    print(f'results written to {output}')
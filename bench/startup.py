@@ -0,0 +1,90 @@
+"""
+startup cost of every list-maker command.
+
+runs each command a few times under python -X importtime, in a scratch copy of a data directory
+(so nothing in the real data/ gets touched), and reports the median wall time, how much of it
+went on imports, the modules that cost the most, and which of the heavy dependencies got
+imported at all. a command that doesn't need bs4, imdb, numpy or asyncio shouldn't pay for them.
+
+usage: python bench/startup.py [--runs 5] [--data data_dir]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import root
+
+# the commands to time, as list-maker.py arguments
+commands = [
+    ['--help'],
+    ['aggregate'],
+    ['aggregate', '--rank', 'kemeny'],
+    ['export'],
+    ['query', '--top', '10'],
+    ['fetch', '--offline'],
+]
+# the imports worth calling out when a command pays for them
+heavy = ['bs4', 'lxml', 'imdb', 'numpy', 'pyarrow', 'asyncio']
+
+
+def parse_importtime(stderr):
+    '''
+    -X importtime output as (top level import -> cumulative microseconds, every module imported)
+    '''
+    top_level = {}
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        # nested imports are indented under the one that pulled them in
+        if not name[1:].startswith(' '):
+            top_level[name.strip()] = int(cumulative)
+    return top_level, modules
+
+
+def time_command(args, cwd):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(root, 'list-maker.py')] + args,
+                            cwd=cwd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    top_level, modules = parse_importtime(result.stderr)
+    return elapsed, top_level, modules, result.returncode
+
+
+def run(runs, data_dir):
+    scratch = tempfile.mkdtemp(prefix='list-maker-startup-')
+    try:
+        if os.path.isdir(data_dir):
+            shutil.copytree(data_dir, os.path.join(scratch, 'data'))
+        print(f'{"command":<28}{"wall":>10}{"imports":>10}  heavy imports / slowest imports')
+        for args in commands:
+            # the first run writes whatever the command writes; only the ones after it are timed
+            time_command(args, scratch)
+            timings = [time_command(args, scratch) for _ in range(runs)]
+            wall = statistics.median(elapsed for elapsed, _, _, _ in timings)
+            imports = statistics.median(sum(top.values()) for _, top, _, _ in timings) / 1e6
+            _, top_level, modules, returncode = timings[-1]
+            loaded = [name for name in heavy if name in modules]
+            slowest = sorted(top_level, key=top_level.get, reverse=True)[:3]
+            label = ' '.join(args) + (' (failed)' if returncode else '')
+            print(f'{label:<28}{wall * 1000:>8.1f}ms{imports * 1000:>8.1f}ms  '
+                  f'{", ".join(loaded) or "-"} / '
+                  + ', '.join(f'{name} {top_level[name] / 1000:.0f}ms' for name in slowest))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='startup time of every list-maker command')
+    parser.add_argument('--runs', type=int, default=5, help='timed runs per command')
+    parser.add_argument('--data', default=os.path.join(root, 'data'),
+                        help='the data directory to run against (default: the repo\'s data/)')
+    args = parser.parse_args()
+    run(args.runs, args.data)
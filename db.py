@@ -0,0 +1,207 @@
+"""
+sqlite storage backend for the movie store.
+
+one json file per movie gets painful once there are thousands of them, so this keeps the whole
+corpus in a single sqlite file. every movie's full 'nary is kept as-is (so it can be exported back
+to the old data/movies/ layout byte for byte), and the ranks, ratings and gross are also split out
+into indexed tables so you can actually query them.
+
+usage:
+    python db.py import data/movies.db [data/movies]    load the json files into the db
+    python db.py export data/movies.db [data/movies]    write the json files back out
+"""
+import json
+import os
+import sqlite3
+import sys
+
+from normalize import title_year_pattern
+from store import JsonBackend, movies_dir
+
+# default location of the database
+db_path = 'data/movies.db'
+
+
+schema = '''
+CREATE TABLE IF NOT EXISTS movies (
+    filename TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    year INTEGER,
+    gross INTEGER,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ranks (
+    filename TEXT NOT NULL,
+    source TEXT NOT NULL,
+    rank INTEGER,
+    PRIMARY KEY (filename, source)
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    filename TEXT NOT NULL,
+    source TEXT NOT NULL,
+    score REAL,
+    reviews INTEGER,
+    PRIMARY KEY (filename, source)
+);
+CREATE INDEX IF NOT EXISTS movies_title ON movies (title COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS movies_year ON movies (year);
+CREATE INDEX IF NOT EXISTS ranks_source ON ranks (source, rank);
+CREATE INDEX IF NOT EXISTS ratings_source ON ratings (source, score);
+'''
+
+
+def to_int(value):
+    '''
+    ranks from some sites (ranker...) come in as strings, so coerce them where we can
+    '''
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class SqliteBackend:
+    '''
+    keeps every movie in one sqlite file. drop-in replacement for store.JsonBackend
+    '''
+
+    def __init__(self, path=db_path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(schema)
+
+    def close(self):
+        self.conn.close()
+
+    def load(self):
+        '''
+        yield (filename, json text) for every movie in the db
+        '''
+        yield from self.conn.execute('SELECT filename, doc FROM movies')
+
+    def write(self, records):
+        '''
+        bulk upsert a list of (filename, data, json text) records in a single transaction
+        '''
+        movie_rows = []
+        rank_rows = []
+        rating_rows = []
+        for filename, data, text in records:
+            title = list(data.keys())[0]
+            movie = data[title]
+            year = title_year_pattern.search(title)
+            movie_rows.append((
+                filename,
+                title,
+                int(year.group(1)) if year else None,
+                movie.get('gross'),
+                text
+            ))
+            for source, rank in movie.get('ranks', {}).items():
+                rank_rows.append((filename, source, to_int(rank)))
+            for source, rating in movie.get('ratings', {}).items():
+                rating_rows.append((filename, source, rating.get('score'), rating.get('reviews')))
+        filenames = [(record[0],) for record in records]
+        with self.conn:
+            # the ranks and ratings get replaced wholesale, since a movie's doc is the source of truth
+            self.conn.executemany('DELETE FROM ranks WHERE filename = ?', filenames)
+            self.conn.executemany('DELETE FROM ratings WHERE filename = ?', filenames)
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO movies (filename, title, year, gross, doc) VALUES (?, ?, ?, ?, ?)',
+                movie_rows)
+            self.conn.executemany(
+                'INSERT INTO ranks (filename, source, rank) VALUES (?, ?, ?)', rank_rows)
+            self.conn.executemany(
+                'INSERT INTO ratings (filename, source, score, reviews) VALUES (?, ?, ?, ?)',
+                rating_rows)
+
+    def delete(self, filenames):
+        '''
+        drop a list of movies (by filename) in a single transaction
+        '''
+        filenames = [(filename,) for filename in filenames]
+        with self.conn:
+            self.conn.executemany('DELETE FROM ranks WHERE filename = ?', filenames)
+            self.conn.executemany('DELETE FROM ratings WHERE filename = ?', filenames)
+            self.conn.executemany('DELETE FROM movies WHERE filename = ?', filenames)
+
+    def by_title(self, title):
+        '''
+        get a movie's data 'nary by its display title (case doesn't matter), or None
+        '''
+        row = self.conn.execute(
+            'SELECT doc FROM movies WHERE title = ? COLLATE NOCASE', (title,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def by_year(self, year):
+        '''
+        get the display titles of every movie released in year
+        '''
+        rows = self.conn.execute('SELECT title FROM movies WHERE year = ? ORDER BY title', (year,))
+        return [row[0] for row in rows]
+
+    def by_source(self, source):
+        '''
+        get a source's list as (rank, display title) pairs, best first
+        '''
+        rows = self.conn.execute(
+            'SELECT ranks.rank, movies.title FROM ranks JOIN movies USING (filename) '
+            'WHERE ranks.source = ? ORDER BY ranks.rank', (source,))
+        return rows.fetchall()
+
+    def ratings(self, source):
+        '''
+        get a source's ratings as (display title, score, reviews), best score first
+        '''
+        rows = self.conn.execute(
+            'SELECT movies.title, ratings.score, ratings.reviews FROM ratings JOIN movies USING (filename) '
+            'WHERE ratings.source = ? ORDER BY ratings.score DESC', (source,))
+        return rows.fetchall()
+
+
+def copy_movies(src, dest):
+    '''
+    copy every movie from one backend to another in one bulk write. returns how many were copied
+    '''
+    records = [(filename, json.loads(text), text) for filename, text in src.load()]
+    if records:
+        dest.write(records)
+    return len(records)
+
+
+def import_json(path=db_path, directory=movies_dir):
+    '''
+    load the per-movie json files into the db
+    '''
+    backend = SqliteBackend(path)
+    try:
+        return copy_movies(JsonBackend(directory), backend)
+    finally:
+        backend.close()
+
+
+def export_json(path=db_path, directory=movies_dir):
+    '''
+    write every movie in the db back out as its own json file, exactly like the old layout
+    '''
+    backend = SqliteBackend(path)
+    try:
+        return copy_movies(backend, JsonBackend(directory))
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('import', 'export'):
+        print(__doc__)
+        sys.exit(1)
+    command, path = sys.argv[1:3]
+    directory = sys.argv[3] if len(sys.argv) > 3 else movies_dir
+    if command == 'import':
+        count = import_json(path, directory)
+    else:
+        count = export_json(path, directory)
+    print(f'{command}ed {count} movies')
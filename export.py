@@ -0,0 +1,240 @@
+"""
+bulk export of the lists and the merged corpus.
+
+the lists go to data/lists/<source>.txt, every one of them (the five original files keep their
+names), written side by side on a thread pool. the corpus goes to data/export/movies.csv,
+movies.jsonl and, if pyarrow is installed, movies.parquet: one row per movie with its year, gross,
+rank on every source, every rating and review count, and its consensus totals.
+
+rows are read straight off the corpus snapshot (see snapshot.py) and written a chunk at a time, so
+the whole export is never built up in memory. data/export/manifest.json remembers what every
+output was generated from; anything whose inputs haven't changed since is left alone.
+
+usage: python export.py [--formats csv,jsonl,parquet] [--force]
+"""
+import argparse
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aggregate import Aggregate, aggregate_path, totals_kept
+from snapshot import Snapshot, snapshot_path
+from store import atomic_open, atomic_write
+
+lists_dir = 'data/lists'
+export_dir = 'data/export'
+manifest_path = os.path.join(export_dir, 'manifest.json')
+
+# the lists that were being saved before every source was, under the names they've always had
+list_filenames = {
+    'imdb': 'imdb.txt',
+    'hollywood_reporter': 'hollywood_reporter.txt',
+    'empire': 'empire.txt',
+    'rotten_tomatoes': 'tomatoes.txt',
+    'wiki_gross': 'wiki_top_grossing.txt',
+}
+
+# how many rows go to disk at once
+chunk_rows = 5000
+# how many files get written at the same time
+export_workers = 8
+
+# parquet needs pyarrow, which is big, so it's only imported when a parquet export actually runs
+has_parquet = importlib.util.find_spec('pyarrow') is not None
+formats = ['csv', 'jsonl'] + (['parquet'] if has_parquet else [])
+
+
+class Manifest:
+    '''
+    output path -> fingerprint of the inputs it was last generated from
+    '''
+
+    def __init__(self, path=manifest_path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as manifest_file:
+                self.entries = json.loads(manifest_file.read())
+
+    def unchanged(self, output, fingerprint):
+        return self.entries.get(output) == fingerprint and os.path.exists(output)
+
+    def mark(self, output, fingerprint):
+        self.entries[output] = fingerprint
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write(self.path, json.dumps(self.entries, indent=2))
+
+
+def list_path(source, directory=lists_dir):
+    return os.path.join(directory, list_filenames.get(source, f'{source}.txt'))
+
+
+def write_lists(site_lists, directory=lists_dir, manifest=None, force=False):
+    '''
+    write every source's list (titles, one per line) to its own file, all at once.
+    lists that are the same as last time are skipped. returns the paths that were written
+    '''
+    manifest = manifest or Manifest()
+    os.makedirs(directory, exist_ok=True)
+    jobs = {}
+    for source, titles in site_lists.items():
+        if not titles:
+            # a source that failed this run keeps whatever it had last time
+            continue
+        path = list_path(source, directory)
+        text = ''.join(title + '\n' for title in titles)
+        fingerprint = hashlib.sha256(text.encode()).hexdigest()
+        if force or not manifest.unchanged(path, fingerprint):
+            jobs[path] = (text, fingerprint)
+    with ThreadPoolExecutor(max_workers=export_workers) as pool:
+        list(pool.map(lambda path: atomic_write(path, jobs[path][0]), jobs))
+    for path, (_, fingerprint) in jobs.items():
+        manifest.mark(path, fingerprint)
+    if jobs:
+        manifest.save()
+    return list(jobs)
+
+
+def file_fingerprint(*paths):
+    '''
+    cheap stand-in for hashing the inputs: their sizes and modification times
+    '''
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append([path, stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            fingerprint.append([path, None, None])
+    return fingerprint
+
+
+def columns(snapshot):
+    return (
+        ['title', 'year', 'gross'] + totals_kept
+        + [f'rank_{source}' for source in snapshot.sources]
+        + [f'score_{source}' for source in snapshot.rating_sources]
+        + [f'reviews_{source}' for source in snapshot.rating_sources]
+    )
+
+
+def whole(value):
+    # ranks and review counts are kept as floats in the snapshot, but are nearly always whole
+    return int(value) if value.is_integer() else value
+
+
+def row_chunks(snapshot, aggregate, size=chunk_rows):
+    '''
+    the corpus as lists of rows (one value per column, None where there isn't one), size at a time
+    '''
+    empty = dict.fromkeys(totals_kept)
+    for start in range(0, len(snapshot), size):
+        stop = min(start + size, len(snapshot))
+        # pull the numeric columns out a chunk at a time; tolist() is much faster than indexing
+        years = snapshot.years[start:stop].tolist()
+        gross = snapshot.gross[start:stop].tolist()
+        ranks = snapshot.ranks[start:stop].tolist()
+        scores = snapshot.scores[start:stop].tolist()
+        reviews = snapshot.reviews[start:stop].tolist()
+        rows = []
+        for i, row in enumerate(range(start, stop)):
+            title = snapshot.titles[row]
+            totals = aggregate.totals.get(title, empty)
+            values = [title, years[i] or None, gross[i]]
+            values += [totals[total] for total in totals_kept]
+            values += [whole(rank) for rank in ranks[i]] + scores[i]
+            # reviews are stored as 0 when there's no rating at all; everything else missing is nan
+            values += [whole(count) if count or score == score else None
+                       for count, score in zip(reviews[i], scores[i])]
+            rows.append([None if value != value else value for value in values])
+        yield rows
+
+
+def write_csv(path, header, chunks):
+    with atomic_open(path, 'w', newline='') as out_file:
+        out_file.write(','.join(header) + '\r\n')
+        for rows in chunks:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            out_file.write(buffer.getvalue())
+
+
+def write_jsonl(path, header, chunks):
+    with atomic_open(path, 'w') as out_file:
+        for rows in chunks:
+            out_file.write(''.join(json.dumps(dict(zip(header, row))) + '\n' for row in rows))
+
+
+def write_parquet(path, header, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([('title', pa.string()), ('year', pa.int32())]
+                       + [(name, pa.float64()) for name in header[2:]])
+    with atomic_open(path, 'wb') as out_file:
+        with pq.ParquetWriter(out_file, schema) as writer:
+            for rows in chunks:
+                # one record batch per chunk, column by column
+                writer.write_batch(pa.record_batch([list(column) for column in zip(*rows)], schema=schema))
+
+
+writers = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'parquet': write_parquet,
+}
+
+
+def export_corpus(formats=formats, directory=export_dir, snapshot_file=snapshot_path,
+                  aggregate_file=aggregate_path, manifest=None, force=False):
+    '''
+    export the corpus in every format asked for, each on its own thread.
+    formats whose inputs haven't changed since their last export are skipped.
+    returns the paths that were written
+    '''
+    manifest = manifest or Manifest()
+    fingerprint = file_fingerprint(snapshot_file, aggregate_file)
+    outputs = {
+        os.path.join(directory, f'movies.{name}'): writers[name] for name in formats
+    }
+    outputs = {
+        path: writer for path, writer in outputs.items()
+        if force or not manifest.unchanged(path, fingerprint)
+    }
+    if not outputs or not os.path.exists(snapshot_file):
+        return []
+    os.makedirs(directory, exist_ok=True)
+    snapshot = Snapshot(snapshot_file)
+    aggregate = Aggregate(aggregate_file)
+    header = columns(snapshot)
+
+    def export(path):
+        outputs[path](path, header, row_chunks(snapshot, aggregate))
+
+    with ThreadPoolExecutor(max_workers=export_workers) as pool:
+        list(pool.map(export, outputs))
+    for path in outputs:
+        manifest.mark(path, fingerprint)
+    manifest.save()
+    return list(outputs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='export the corpus as csv, jsonl or parquet')
+    parser.add_argument('--formats', default=','.join(formats),
+                        help=f'comma separated, any of {", ".join(writers)} (default {",".join(formats)})')
+    parser.add_argument('--force', action='store_true', help='rewrite everything, changed or not')
+    args = parser.parse_args()
+    written = export_corpus(args.formats.split(','), force=args.force)
+    for path in written:
+        print(f'wrote {path}')
+    if not written:
+        print('nothing changed')
@@ -0,0 +1,153 @@
+"""
+fetch layer for list-maker.
+
+downloading the pages one after another means a run takes as long as every site's latency
+added together. this grabs all of them at once on a small thread pool, while making sure we
+don't hammer any single host (timeout.com hosts two of the lists, for example).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.client import HTTPException
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+# how many requests can be in flight at once (one per source is plenty)
+max_workers = 11
+# how many requests can hit the same host at once
+per_host_limit = 2
+# seconds to wait on a socket before giving up
+timeout = 30
+# how many times to try a url before giving up on it
+retries = 3
+# seconds to wait before the first retry, doubled after every failed attempt
+backoff = 1.0
+
+# status codes that are worth another try. anything else (404, 403...) won't fix itself
+retry_statuses = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    '''
+    raised when a url couldn't be downloaded after all retries
+    '''
+
+    def __init__(self, url, reason):
+        super().__init__(f'could not fetch {url}: {reason}')
+        self.url = url
+        self.reason = reason
+
+
+class HostLimiter:
+    '''
+    hands out one semaphore per host so every host gets its own concurrency limit
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.limit)
+            return self._semaphores[host]
+
+
+def fetch(url, headers=None, timeout=timeout, retries=retries, backoff=backoff, limiter=None,
+          cache=None, offline=False):
+    '''
+    download url and return the body as bytes, retrying with exponential backoff.
+    with a cache (http_cache.ResponseCache), fresh pages come straight from disk and stale ones
+    are revalidated; offline never touches the network at all
+    '''
+    headers = dict(headers or {})
+    if cache is not None:
+        entry = cache.get(url)
+        if entry is not None and (offline or cache.fresh(entry)):
+            return cache.body(url)
+        headers.update(cache.validators(url))
+    if offline:
+        raise FetchError(url, 'not in the cache (running offline)')
+    req = Request(url, headers=headers)
+    delay = backoff
+    for attempt in range(retries):
+        try:
+            if limiter is None:
+                return download(req, timeout, cache)
+            with limiter(url):
+                return download(req, timeout, cache)
+        except HTTPError as e:
+            # urllib treats 304 as an error, but it just means our cached copy is still good
+            if e.code == 304 and cache is not None:
+                cache.revalidated(url)
+                return cache.body(url)
+            # the server answered, but not with the page. only some of these are worth retrying
+            if e.code not in retry_statuses:
+                raise FetchError(url, e) from e
+            reason = e
+        except (HTTPException, OSError) as e:
+            # anything from a dropped connection or an ssl hiccup to a body cut short
+            # (IncompleteRead) is worth another try
+            reason = e
+        # don't bother sleeping after the last attempt
+        if attempt < retries - 1:
+            time.sleep(delay)
+            delay *= 2
+    raise FetchError(url, reason)
+
+
+def download(req, timeout=timeout, cache=None):
+    '''
+    do the actual request, saving the response to the cache if there is one
+    '''
+    with urlopen(req, timeout=timeout) as page:
+        body = page.read()
+        if cache is not None:
+            cache.store(req.full_url, body, page.headers)
+    return body
+
+
+def fetch_all(jobs, workers=max_workers, host_limit=per_host_limit, stats=None, **kwargs):
+    '''
+    download every url in jobs at the same time.
+    jobs is formatted like so:
+    {
+        "imdb": ("https://www.imdb.com/...", {"User-Agent": "Mozilla/5.0"}),
+        "empire": ("https://www.empireonline.com/...", None)
+    }
+    yields (name, body, error) tuples in the order the downloads finish, so the caller can
+    start parsing as soon as the first page lands. body is None when error is set.
+    with stats (an instrument.RunStats), every download's latency and size is recorded
+    under its name.
+    '''
+    limiter = HostLimiter(host_limit)
+
+    def timed_fetch(name, url, headers):
+        start = time.perf_counter()
+        body = fetch(url, headers, limiter=limiter, **kwargs)
+        if stats is not None:
+            stats.add(name, 'fetch_s', time.perf_counter() - start)
+            stats.add(name, 'fetch_bytes', len(body))
+        return body
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(timed_fetch, name, url, headers): name
+            for name, (url, headers) in jobs.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                body = future.result()
+            except FetchError as e:
+                yield name, None, e
+            except Exception as e:
+                # anything else still has to be reported as that source's error, or it would
+                # take every other download down with it
+                yield name, None, FetchError(jobs[name][0], e)
+            else:
+                yield name, body, None
@@ -0,0 +1,140 @@
+"""
+per-source fingerprints, so a source that hasn't changed costs next to nothing.
+
+most of the lists are the same from one run to the next, but a page can still come back different:
+a new ad, a timestamp, a reshuffled sidebar. so every source gets two fingerprints in
+data/source_manifest.json:
+    page    sha256 of the raw page. when it matches, the page isn't even parsed; the titles it gave
+            last time are reused
+    list    sha256 of what the parser pulled out of it (every title and the movie data that came
+            with it). when only the page changed, this still matches, and nothing gets merged,
+            recounted or written
+a source only counts as changed when its list fingerprint does.
+
+neither is trusted blindly: a page fingerprint only counts if it was taken with the same parser code
+(so fixing a parser gets every page parsed again), and either one only counts if the movies the
+source gave last time are still in the store (so a wiped data/movies/, or a switch to sqlite,
+gets everything parsed and merged again). list-maker.py fetch --reparse ignores them completely.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from functools import lru_cache
+
+from store import atomic_write
+
+# where the fingerprints live between runs
+manifest_path = 'data/source_manifest.json'
+# bump when what gets merged changes in a way the parser code doesn't show
+schema_version = 1
+# the modules that decide what a page parses into
+parser_modules = ['sources', 'parsing', 'normalize', 'records']
+
+
+@lru_cache(maxsize=None)
+def parser_hash():
+    '''
+    fingerprint of the parser code (and the schema version); any change means every page is reparsed
+    '''
+    digest = hashlib.sha256(str(schema_version).encode())
+    for module in parser_modules:
+        with open(importlib.util.find_spec(module).origin, 'rb') as module_file:
+            digest.update(module_file.read())
+    return digest.hexdigest()
+
+
+def page_hash(page):
+    if isinstance(page, str):
+        page = page.encode('utf-8')
+    return hashlib.sha256(page).hexdigest()
+
+
+def list_hash(records):
+    '''
+    fingerprint of a parser's (list title, records.Movie or None) records
+    '''
+    digest = hashlib.sha256()
+    for title, movie in records:
+        data = movie.to_data() if movie is not None else None
+        digest.update(json.dumps([title, data], sort_keys=True).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class SourceManifest:
+    '''
+    source -> {page, list, parser, titles, movies, changed_at}.
+    with force, no source is skipped until it has been parsed again
+    '''
+
+    def __init__(self, path=manifest_path, force=False):
+        self.path = path
+        self.force = force
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as manifest_file:
+                self.entries = json.loads(manifest_file.read())
+        # sources marked this run
+        self.marked = set()
+        self.dirty = False
+
+    def trusted(self, source, in_store):
+        '''
+        source's entry, if it can be relied on: not forced, and every movie it gave last time is
+        still in the store with its data (in_store is handed the source and their titles)
+        '''
+        if self.force and source not in self.marked:
+            return None
+        entry = self.entries.get(source)
+        if entry is None or 'movies' not in entry or not in_store(source, entry['movies']):
+            return None
+        return entry
+
+    def unchanged_page(self, source, page_digest, in_store):
+        '''
+        the titles source gave last time if its page (and the parser) is exactly the same as then,
+        else None
+        '''
+        entry = self.trusted(source, in_store)
+        if entry is None or entry['page'] != page_digest or entry.get('parser') != parser_hash():
+            return None
+        return entry['titles']
+
+    def unchanged_list(self, source, list_digest, in_store):
+        entry = self.trusted(source, in_store)
+        return entry is not None and entry['list'] == list_digest
+
+    def mark(self, source, page_digest, list_digest, titles, movies):
+        '''
+        remember what source's page and list look like now, along with the titles of the movies
+        it gave data for
+        '''
+        self.marked.add(source)
+        entry = self.entries.get(source)
+        changed = entry is None or entry['list'] != list_digest
+        if (entry is not None and not changed and entry['page'] == page_digest
+                and entry.get('parser') == parser_hash() and entry.get('movies') == movies):
+            return
+        self.entries[source] = {
+            'page': page_digest,
+            'list': list_digest,
+            'parser': parser_hash(),
+            'titles': list(titles),
+            'movies': list(movies),
+            'changed_at': time.time() if changed else entry['changed_at'],
+        }
+        self.dirty = True
+
+    def save(self):
+        '''
+        write the fingerprints, if any of them moved
+        '''
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write(self.path, json.dumps(self.entries))
+        self.dirty = False
@@ -0,0 +1,66 @@
+"""
+tiny local http stand-in for the real sites. serves saved html pages out of a fixtures
+directory so the fetch layer (and the parsers) can be exercised without touching the network.
+
+every source is served at /<source name>.html, e.g. fixtures/imdb.html -> /imdb.html
+
+usage: python fixture_server.py [fixtures dir] [port]
+"""
+import functools
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# where saved pages live by default
+fixtures_dir = 'data/fixtures'
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    '''
+    plain static file handler that can pretend to be a slow site
+    '''
+    # seconds to sit on every request before answering
+    delay = 0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        # keep quiet, nobody wants a log line per request
+        pass
+
+
+def serve_fixtures(directory=fixtures_dir, port=0, delay=0):
+    '''
+    start serving directory on localhost in a background thread.
+    returns (server, base_url); call server.shutdown() when done
+    '''
+    handler = type('DelayedFixtureHandler', (FixtureHandler,), {'delay': delay})
+    handler = functools.partial(handler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}'
+
+
+def fixture_jobs(base_url, names):
+    '''
+    build a fetch_all() jobs 'nary that points every source name at the stand-in
+    '''
+    return {name: (f'{base_url}/{name}.html', None) for name in names}
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else fixtures_dir
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    server, base_url = serve_fixtures(directory, port)
+    print(f'serving {directory} at {base_url}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,236 @@
+"""
+history of every source's list, run by run.
+
+data/lists/*.txt and the ranks in the movie files only ever hold the latest run, so there's no way
+to tell how a movie has moved over time. keeping a full copy of every list for every run would
+mostly be storing the same hundred titles over and over, so instead each source gets a log in
+data/history/<source>.jsonl with one line per run where its list changed:
+
+    {"run": 12, "delta": {"added": [["Parasite (2019)", 40]], "removed": ["..."], "moved": [["...", 3]]}}
+
+every checkpoint_every changes the full list is written out instead ({"run": 20, "list": [...]}),
+so getting back any past list means starting from the checkpoint before it and applying at most
+checkpoint_every - 1 deltas, never replaying the whole log. a movie's rank over time only needs the
+deltas that mention it.
+
+runs are numbered in data/history/runs.json, which also keeps when each one happened.
+
+usage:
+    python history.py runs                          every run and when it happened
+    python history.py list <source> [run]           a source's list as of a run (default latest)
+    python history.py series <source> <title>       a movie's rank on a source, run by run
+"""
+import bisect
+import json
+import os
+import sys
+import time
+
+from store import atomic_write
+
+# where the logs live
+history_dir = 'data/history'
+# how many changes a source can go through before its full list is written out again
+checkpoint_every = 10
+
+
+def as_ranks(movies):
+    '''
+    a list (best first) as movie -> rank. a list that names a movie twice keeps its best spot
+    '''
+    ranks = {}
+    for rank, movie in enumerate(movies, 1):
+        ranks.setdefault(movie, rank)
+    return ranks
+
+
+def diff(old, new):
+    '''
+    what changed between two movie -> rank 'naries, or None if nothing did
+    '''
+    added = [[movie, rank] for movie, rank in new.items() if movie not in old]
+    removed = [movie for movie in old if movie not in new]
+    moved = [[movie, rank] for movie, rank in new.items() if movie in old and old[movie] != rank]
+    if not (added or removed or moved):
+        return None
+    return {'added': added, 'removed': removed, 'moved': moved}
+
+
+def apply(ranks, delta):
+    '''
+    apply a delta to a movie -> rank 'nary in place
+    '''
+    for movie in delta['removed']:
+        del ranks[movie]
+    for movie, rank in delta['added']:
+        ranks[movie] = rank
+    for movie, rank in delta['moved']:
+        ranks[movie] = rank
+    return ranks
+
+
+class SourceLog:
+    '''
+    one source's entries, plus where its checkpoints are
+    '''
+
+    def __init__(self, entries):
+        self.entries = entries
+        # run number of every entry, for bisecting
+        self.runs = [entry['run'] for entry in entries]
+        # index of every checkpoint entry
+        self.checkpoints = [i for i, entry in enumerate(entries) if 'list' in entry]
+        self._latest = None
+
+    def ranks_at(self, index):
+        '''
+        the list as movie -> rank right after entry index
+        '''
+        start = self.checkpoints[bisect.bisect_right(self.checkpoints, index) - 1]
+        ranks = as_ranks(self.entries[start]['list'])
+        for entry in self.entries[start + 1:index + 1]:
+            apply(ranks, entry['delta'])
+        return ranks
+
+    def latest(self):
+        if self._latest is None:
+            self._latest = self.ranks_at(len(self.entries) - 1) if self.entries else {}
+        return self._latest
+
+    def since_checkpoint(self):
+        return len(self.entries) - 1 - self.checkpoints[-1] if self.entries else None
+
+    def append(self, entry, ranks):
+        if 'list' in entry:
+            self.checkpoints.append(len(self.entries))
+        self.entries.append(entry)
+        self.runs.append(entry['run'])
+        self._latest = ranks
+
+
+class History:
+    '''
+    the versioned lists. record() each source's list once per run, then save()
+    '''
+
+    def __init__(self, directory=history_dir):
+        self.directory = directory
+        self.runs = []
+        runs_path = os.path.join(directory, 'runs.json')
+        if os.path.exists(runs_path):
+            with open(runs_path, 'r') as runs_file:
+                self.runs = json.loads(runs_file.read())
+        # source -> SourceLog, loaded the first time a source is touched
+        self.logs = {}
+        # source -> lines that still need appending to its log
+        self.pending = {}
+        self.run = None
+
+    def log_path(self, source):
+        return os.path.join(self.directory, f'{source}.jsonl')
+
+    def log(self, source):
+        if source not in self.logs:
+            entries = []
+            path = self.log_path(source)
+            if os.path.exists(path):
+                with open(path, 'r') as log_file:
+                    entries = [json.loads(line) for line in log_file if line.strip()]
+            self.logs[source] = SourceLog(entries)
+        return self.logs[source]
+
+    def start_run(self, now=None):
+        '''
+        number a new run. everything record()ed until the next start_run() belongs to it
+        '''
+        self.run = (self.runs[-1]['run'] + 1) if self.runs else 1
+        self.runs.append({'run': self.run, 'at': now or time.time()})
+        return self.run
+
+    def record(self, source, movies):
+        '''
+        record a source's list (titles, best first) for the current run.
+        returns the delta that was stored, the full list if it was time for a checkpoint,
+        or None if the list hasn't changed
+        '''
+        if self.run is None:
+            self.start_run()
+        log = self.log(source)
+        ranks = as_ranks(movies)
+        delta = diff(log.latest(), ranks)
+        if delta is None and (log.entries or not ranks):
+            return None
+        since = log.since_checkpoint()
+        if since is None or since + 1 >= checkpoint_every:
+            entry = {'run': self.run, 'list': list(movies)}
+        else:
+            entry = {'run': self.run, 'delta': delta}
+        log.append(entry, ranks)
+        self.pending.setdefault(source, []).append(json.dumps(entry))
+        return entry.get('delta', entry.get('list'))
+
+    def list_at(self, source, run=None):
+        '''
+        a source's list (titles, best first) as it was at the end of run (default: the latest)
+        '''
+        log = self.log(source)
+        index = len(log.entries) - 1 if run is None else bisect.bisect_right(log.runs, run) - 1
+        if index < 0:
+            return []
+        ranks = log.latest() if index == len(log.entries) - 1 else log.ranks_at(index)
+        return sorted(ranks, key=ranks.get)
+
+    def rank_series(self, source, movie):
+        '''
+        a movie's rank on a source over time, as (run, rank) pairs for every run where it changed.
+        rank is None for runs where it dropped off the list
+        '''
+        series = []
+        for entry in self.log(source).entries:
+            if 'list' in entry:
+                rank = as_ranks(entry['list']).get(movie)
+            else:
+                delta = entry['delta']
+                if movie in delta['removed']:
+                    rank = None
+                else:
+                    rank = next((r for m, r in delta['added'] + delta['moved'] if m == movie), False)
+                    if rank is False:
+                        continue
+            if not series or series[-1][1] != rank:
+                series.append((entry['run'], rank))
+        # a movie that isn't on the list yet has no history to speak of
+        while series and series[0][1] is None:
+            series.pop(0)
+        return series
+
+    def save(self):
+        if not self.pending:
+            # a run where no list changed leaves no trace
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # the logs are appended to; the lines are small, so each lands in one write
+        for source, lines in self.pending.items():
+            with open(self.log_path(source), 'a') as log_file:
+                log_file.write(''.join(line + '\n' for line in lines))
+        self.pending = {}
+        atomic_write(os.path.join(self.directory, 'runs.json'), json.dumps(self.runs))
+
+
+if __name__ == "__main__":
+    commands = {'runs': 0, 'list': 1, 'series': 2}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands or len(sys.argv) < 2 + commands[sys.argv[1]]:
+        print(__doc__)
+        sys.exit(1)
+    history = History()
+    command = sys.argv[1]
+    if command == 'runs':
+        for run in history.runs:
+            print(run['run'], time.strftime('%Y-%m-%d %H:%M', time.localtime(run['at'])))
+    elif command == 'list':
+        run = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        for rank, movie in enumerate(history.list_at(sys.argv[2], run), 1):
+            print(f'{rank}. {movie}')
+    else:
+        for run, rank in history.rank_series(sys.argv[2], sys.argv[3]):
+            print(run, '-' if rank is None else rank)
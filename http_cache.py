@@ -0,0 +1,132 @@
+"""
+on-disk cache for the source pages.
+
+most of these lists barely ever change, so there's no point downloading them in full on every run.
+every response is saved along with its ETag/Last-Modified headers; within the ttl the saved copy is
+used as-is, and after that the site is asked "has this changed?" (If-None-Match/If-Modified-Since).
+a 304 means we just reuse what we've got. (whether a page needs parsing again is up to
+fingerprint.py, which doesn't care where the page came from.)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from store import atomic_write
+
+# where cached pages live
+cache_dir = 'data/cache'
+# seconds a cached page is trusted without asking the site
+default_ttl = 6 * 60 * 60
+# once the cache grows past this many bytes, the least recently used pages get thrown out
+default_max_bytes = 100 * 1024 * 1024
+
+
+class ResponseCache:
+    '''
+    url -> page cache with revalidation headers, a ttl and lru eviction.
+    safe to share between the fetcher's threads
+    '''
+
+    def __init__(self, directory=cache_dir, ttl=default_ttl, max_bytes=default_max_bytes):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, 'index.json')
+        self._lock = threading.Lock()
+        # url -> {file, etag, last_modified, fetched_at, last_used, size}
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as index_file:
+                self.entries = json.loads(index_file.read())
+
+    def get(self, url):
+        '''
+        get the entry for url, or None if it isn't cached (or its file went missing)
+        '''
+        with self._lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            if not os.path.exists(os.path.join(self.directory, entry['file'])):
+                del self.entries[url]
+                return None
+            return entry
+
+    def fresh(self, entry):
+        '''
+        is the entry young enough to use without revalidating
+        '''
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def validators(self, url):
+        '''
+        conditional request headers for url, based on what the site told us last time
+        '''
+        entry = self.get(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def body(self, url):
+        '''
+        read the cached page for url
+        '''
+        with self._lock:
+            entry = self.entries[url]
+            entry['last_used'] = time.time()
+            with open(os.path.join(self.directory, entry['file']), 'rb') as page_file:
+                return page_file.read()
+
+    def store(self, url, body, headers):
+        '''
+        save a freshly downloaded page along with its revalidation headers
+        '''
+        filename = hashlib.sha1(url.encode()).hexdigest() + '.html'
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write(os.path.join(self.directory, filename), body)
+            now = time.time()
+            self.entries[url] = {
+                'file': filename,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'fetched_at': now,
+                'last_used': now,
+                'size': len(body),
+            }
+            self._evict()
+
+    def revalidated(self, url):
+        '''
+        the site said 304 not modified, so the cached page is good for another ttl
+        '''
+        with self._lock:
+            self.entries[url]['fetched_at'] = time.time()
+
+    def _evict(self):
+        # throw out the least recently used pages until we're back under the size limit
+        total = sum(entry['size'] for entry in self.entries.values())
+        for url in sorted(self.entries, key=lambda u: self.entries[u]['last_used']):
+            if total <= self.max_bytes:
+                break
+            entry = self.entries.pop(url)
+            total -= entry['size']
+            try:
+                os.unlink(os.path.join(self.directory, entry['file']))
+            except FileNotFoundError:
+                pass
+
+    def save(self):
+        '''
+        write the index to disk
+        '''
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write(self.index_path, json.dumps(self.entries))
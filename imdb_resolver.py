@@ -0,0 +1,134 @@
+"""
+batch imdb id lookups with a persistent cache.
+
+IMDb().search_movie() is one slow remote search per title, so doing it for every title on every
+list on every run is out of the question. ImdbResolver dedupes titles across all the lists (so
+"CITIZEN KANE (1941)" and "Citizen Kane (1941)" are one lookup), only searches for titles it hasn't
+seen before, runs those searches on a small thread pool, and remembers the answers (including "no
+match") in data/imdb_ids.json so the next run doesn't have to ask again.
+
+the backend just needs a search_movie(title, results=n) method returning objects with a .movieID
+and dict-style ['year'] access, like imdb.IMDb. pass in a stub to test without the network.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from matcher import normalize_title, split_year
+from store import atomic_write
+
+# where resolved ids are kept between runs
+ids_path = 'data/imdb_ids.json'
+# how long a found id is trusted before it's looked up again
+found_ttl = 90 * 24 * 60 * 60
+# "no match" answers expire sooner, since imdb might just not have had it yet
+missing_ttl = 7 * 24 * 60 * 60
+# how many searches to run at once (imdb doesn't like being hammered)
+default_workers = 4
+# how many search results to look through for one with the right year
+search_results = 5
+
+
+def lookup_key(display_title):
+    '''
+    the cache key for a title: its normalized form plus year, so spelling differences share a key
+    '''
+    title, year = split_year(display_title)
+    normalized = normalize_title(title)
+    if not normalized:
+        # nothing left to normalize on, so don't let it share a key with anything else
+        return f'{display_title}||'
+    return f'{normalized}|{year or ""}'
+
+
+class ImdbResolver:
+    '''
+    display title -> imdb movie id, with a persistent cache in front of the imdb search
+    '''
+
+    def __init__(self, backend=None, path=ids_path, workers=default_workers):
+        self._backend = backend
+        self.path = path
+        self.workers = workers
+        # lookup key -> {"id": movie id or None, "at": when we looked it up}
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as ids_file:
+                self.entries = json.loads(ids_file.read())
+
+    @property
+    def backend(self):
+        # the imdb package is slow to import, so only pull it in once we actually need to search
+        if self._backend is None:
+            from imdb import IMDb
+            self._backend = IMDb()
+        return self._backend
+
+    def cached(self, key, now=None):
+        '''
+        the cached entry for key, or None if we don't have one or it's expired
+        '''
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        ttl = found_ttl if entry['id'] is not None else missing_ttl
+        if (now or time.time()) - entry['at'] > ttl:
+            return None
+        return entry
+
+    def search(self, display_title):
+        '''
+        ask imdb for display_title; returns the movie id or None
+        '''
+        _, year = split_year(display_title)
+        results = self.backend.search_movie(display_title, results=search_results)
+        for result in results:
+            result_year = result.get('year')
+            # sites disagree on the release year by one every now and then
+            if year is None or (result_year is not None and abs(result_year - year) <= 1):
+                return result.movieID
+        return None
+
+    def try_search(self, display_title):
+        '''
+        search(), but hands back (movie id, error) instead of raising, so one bad search
+        doesn't sink the whole batch
+        '''
+        try:
+            return self.search(display_title), None
+        except Exception as e:
+            return None, e
+
+    def resolve_all(self, display_titles):
+        '''
+        resolve every title, only searching for the ones we don't already know.
+        returns display title -> movie id (None if imdb has no match)
+        '''
+        now = time.time()
+        keys = {}
+        for display_title in display_titles:
+            keys.setdefault(lookup_key(display_title), display_title)
+        missing = {key: title for key, title in keys.items() if self.cached(key, now) is None}
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                found = pool.map(self.try_search, missing.values())
+                for (key, display_title), (movie_id, error) in zip(missing.items(), found):
+                    if error is not None:
+                        # don't cache a failed search, just try again next time
+                        print(f'could not look up {display_title}: {error}')
+                        continue
+                    self.entries[key] = {'id': movie_id, 'at': now}
+        return {
+            display_title: self.entries.get(lookup_key(display_title), {}).get('id')
+            for display_title in display_titles
+        }
+
+    def resolve(self, display_title):
+        return self.resolve_all([display_title])[display_title]
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write(self.path, json.dumps(self.entries))
@@ -0,0 +1,169 @@
+"""
+timers and counters for a list-maker run.
+
+a slow run could be the network, BeautifulSoup, the normalization, or the movie files, and there's
+no telling which from the outside. RunStats keeps wall time per stage plus timers and counters per
+source (bytes fetched, fetch latency, parse time, items parsed, merge time), and writes it all out
+as json next to data/lists/ at the end of the run.
+
+with profiling on, the run is also recorded with cProfile and tracemalloc. parsing happens in
+other processes, so each parse is profiled where it runs and the profiles are added together
+afterwards. the combined profile is dumped to data/run.prof (open it with pstats or snakeviz).
+"""
+import cProfile
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+from store import atomic_write
+
+# where the report for the last run goes
+report_path = 'data/run_report.json'
+# where the combined cProfile output goes when profiling
+profile_path = 'data/run.prof'
+# how many functions and allocation sites make it into the report
+top_entries = 25
+
+
+def timed_call(func, *args, profile=False):
+    '''
+    run func(*args) and return (result, seconds, profile file or None).
+    this is what actually gets sent to the parser processes, so it has to live at the top level
+    '''
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        result = func(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    elapsed = time.perf_counter() - start
+    if profiler is None:
+        return result, elapsed, None
+    # profiles can't be pickled, so hand the parent a file to read instead
+    fd, path = tempfile.mkstemp(prefix='list-maker-', suffix='.prof')
+    os.close(fd)
+    profiler.dump_stats(path)
+    return result, elapsed, path
+
+
+class RunStats:
+    '''
+    everything we measured during one run
+    '''
+
+    def __init__(self):
+        self.started = time.time()
+        # stage -> seconds
+        self.stages = defaultdict(float)
+        # counter -> total, for things that aren't tied to one source (files read, files written...)
+        self.counters = defaultdict(int)
+        # source -> stat -> total
+        self.sources = defaultdict(lambda: defaultdict(int))
+        # the fetches report in from their own threads
+        self.lock = threading.Lock()
+        self.profiler = None
+        # profiles dumped by the parser processes
+        self.profile_files = []
+        self.profile_report = None
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        time everything inside the with block as part of stage name
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def add(self, source, stat, amount):
+        with self.lock:
+            self.sources[source][stat] += amount
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    @property
+    def profiling(self):
+        return self.profiler is not None
+
+    def start_profile(self):
+        self.profiler = cProfile.Profile()
+        tracemalloc.start()
+        self.profiler.enable()
+
+    def add_profile(self, path):
+        '''
+        fold in a profile that was recorded in another process
+        '''
+        if path is not None:
+            self.profile_files.append(path)
+
+    def stop_profile(self, path=profile_path):
+        '''
+        stop profiling, dump the combined profile to path and summarize it for the report
+        '''
+        self.profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profile = pstats.Stats(self.profiler)
+        for profile_file in self.profile_files:
+            profile.add(profile_file)
+            os.remove(profile_file)
+        self.profile_files = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(path)
+        functions = sorted(profile.stats.items(), key=lambda item: item[1][3], reverse=True)
+        self.profile_report = {
+            'file': path,
+            'functions': [
+                {
+                    'function': f'{filename}:{line}({function})',
+                    'calls': calls,
+                    'own_s': own,
+                    'cumulative_s': cumulative
+                }
+                for (filename, line, function), (_, calls, own, cumulative, _) in functions[:top_entries]
+            ],
+            'memory': {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top': [
+                    {'where': str(stat.traceback), 'bytes': stat.size, 'blocks': stat.count}
+                    for stat in snapshot.statistics('lineno')[:top_entries]
+                ]
+            }
+        }
+        self.profiler = None
+
+    def report(self):
+        report = {
+            'started': self.started,
+            'total_s': time.time() - self.started,
+            'stages': dict(self.stages),
+            'counters': dict(self.counters),
+            'sources': {name: dict(stats) for name, stats in sorted(self.sources.items())}
+        }
+        if self.profile_report is not None:
+            report['profile'] = self.profile_report
+        return report
+
+    def save(self, path=report_path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write(path, json.dumps(self.report(), indent=2))
@@ -8,78 +8,87 @@ compiles all lists into one big list, and counts how often a movie appears in th
 AUTHOR: Preston Carlton
 DATE CREATED: Feb 28, 2020
 """
+import argparse
 import os
-import re
-from urllib.request import Request, urlopen
-from bs4 import BeautifulSoup
-from imdb import IMDb
-from string import capwords
-import json
-import collections.abc
-
-# all urls
-imdb_url = "https://www.imdb.com/list/ls055592025/?mode=simple"
-hwood_reporter_url = "https://www.hollywoodreporter.com/lists/100-best-films-ever-hollywood-favorites-818512"
-empire_url = "https://www.empireonline.com/movies/features/best-movies-2/"
-rt_url = "https://www.rottentomatoes.com/top/bestofrt/"
-wiki_gross_url = "https://en.wikipedia.org/wiki/List_of_highest-grossing_films"
-afi_url = "https://www.afi.com/afis-100-years-100-movies/"
-timeout_url = "https://www.timeout.com/newyork/movies/best-movies-of-all-time"
-timeout_actors_url = "https://www.timeout.com/newyork/movies/100-best-movies-as-chosen-by-actors"
-binsider_url = "https://www.businessinsider.com/50-best-movies-all-time-critics-2016-10"
-ranker_url = "https://www.ranker.com/crowdranked-list/the-best-movies-of-all-time"
-goodmovies_url = "https://goodmovieslist.com/best-movies/best-250-movies.html"
-
-# lists to contain all movie titles
-imdb_list = []
-hwood_reporter_list = []
-empire_list = []
-rt_list = []
-wiki_gross_list = []
-afi_list = []
-timeout_list = []
-timeout_actors_list = []
-binsider_list = []
-ranker_list = []
-goodmovies_list = []
-
-# illegal chars list for filenames
-illegal_chars = [
-    '!',
-    ',',
-    '-',
-    '&',
-    '?',
-    '/',
-    '\\',
-    "'",
-    ':',
-    '.',
-    '—',
-    '·'
-]
+import random
+import sys
+import time
+from store import JsonBackend, MovieStore
+from records import Movie
+from http_cache import ResponseCache
+from matcher import TitleResolver
+from aggregate import Aggregate, totals_kept
+from history import History
+from fingerprint import SourceManifest, list_hash, page_hash
+from scoring import Scores
+from imdb_resolver import ImdbResolver
+from instrument import RunStats, timed_call
+from sources import registry, run_parser
+
+# everything heavy (bs4, imdb, numpy, asyncio, the process pool, the network code) is imported
+# inside the functions that need it, so a command only pays for what it actually uses.
+# bench/startup.py keeps track of what each command costs to start up
+
+# lists to contain all movie titles, one per source
+site_lists = {name: [] for name in registry}
+
+# how many processes parse pages at once (None for one per cpu)
+parse_workers = None
+
+# how many sources the daemon refreshes at once
+daemon_concurrency = 4
+# every wait between refreshes is nudged by up to this fraction of the interval either way,
+# so sources that share an interval don't all hit the network at the same moment
+daemon_jitter = 0.1
 
 # nary to contain all the information about the movies
 master_list = {}
 
+# set this to a path (like 'data/movies.db') to keep every movie in one sqlite file
+# instead of one json file per movie. `python db.py export` turns it back into json files
+movies_db = None
 
+# every movie's data, loaded once and written back in one go at the end of the run
+if movies_db:
+    from db import SqliteBackend
+    movie_store = MovieStore(SqliteBackend(movies_db))
+else:
+    movie_store = MovieStore(JsonBackend())
 
-def update(orig, new):
+# maps every site's spelling of a movie onto one canonical title
+title_resolver = TitleResolver()
+
+# timers and counters for this run, saved to data/run_report.json at the end
+run_stats = RunStats()
+
+
+def resolve_title(display_title):
+    '''
+    get the canonical title for a movie, however the site happened to spell it
+    '''
+    if not title_resolver.seeded:
+        # movies we already have datafiles for get first dibs on being the canonical title
+        title_resolver.seed(movie_store.titles())
+    canonical_title = title_resolver.resolve(display_title)
+    # a yearless movie that just got its year has a new canonical title, so its data moves with it
+    for old_title, new_title in title_resolver.take_retitled():
+        movie_store.rename(old_title, new_title)
+    return canonical_title
+
+
+def resolve_lists():
     '''
-    helper function to assist in updating nested dictionaries
+    resolve every title on every list once before any of them get counted, so a yearless title
+    that a dated one takes over later in the run is counted under its final canonical title
     '''
-    for k, v in new.items():
-        if isinstance(v, collections.abc.Mapping):
-            orig[k] = update(orig.get(k, {}), v)
-        else:
-            orig[k] = v
-    return orig
+    for site_list in site_lists.values():
+        for movie in site_list:
+            resolve_title(movie)
 
 
 def update_movie_data(data):
     '''
-    updates the movie's datafile with given 'nary
-    data is formatted like so:
+    updates the movie's datafile with a records.Movie, or a 'nary formatted like so:
     {
         "The Godfather (1972)": {
             "ranks":{
@@ -102,472 +111,627 @@ def update_movie_data(data):
     }
 
     '''
-    # get the filename of the movie
-    movie_title = list(data.keys())[0]
-    # remove all bad chars
-    filename = movie_title.translate({ord(c): None for c in illegal_chars})
-    # replace all the double spaces
-    filename = filename.replace('  ', ' ')
-    filename = filename.replace(' ', '_')
-    filename = filename.lower() + '.json'
-
-    if not os.path.exists(f'data/movies/{filename}'):
-        # if the movie doesn't already have a datafile, we can create one now
-        with open(f'data/movies/{filename}', 'w') as movie_file:
-            movie_file.write(json.dumps(data))
-        # exit the func so nothing else happens
-        return
-    # if it does exist, we need to update the 'nary
-    with open(f'data/movies/{filename}', 'r') as movie_file:
-        stored_data = movie_file.read()
-    # load it into a json 'nary
-
-    stored_data = json.loads(stored_data)
-    # here we need to access the first item in the 'nary rather than
-    # just overwriting the whole thing. this way, we can account for naming
-    # discrepancies
-
-    update(stored_data,data)
-    # finally, save the newly-updated data to the datafile
-    with open(f'data/movies/{filename}', 'w') as movie_file:
-        movie_file.write(json.dumps(stored_data))
+    if not isinstance(data, Movie):
+        data = Movie.from_data(data)
+    # file the data under the movie's canonical title, so the same movie from
+    # different sites doesn't end up in different datafiles
+    canonical_title = resolve_title(data.title)
+    if canonical_title != data.title:
+        data = data.retitled(canonical_title)
+    # merges happen in memory; nothing touches the disk until movie_store.flush()
+    movie_store.merge(data)
+
+
+def merge_records(name, records):
+    '''
+    the one place parsed records end up: each movie's data goes into the store,
+    and its title onto the site's list
+    '''
+    start = time.perf_counter()
+    site_list = site_lists[name]
+    for list_title, movie_data in records:
+        if movie_data is not None:
+            update_movie_data(movie_data)
+        site_list.append(list_title)
+    run_stats.add(name, 'merge_s', time.perf_counter() - start)
+    run_stats.add(name, 'items', len(records))
 
 
-def parse_imdb():
+def in_store(source, titles):
     '''
-    parse the imdb_url and save movie titles to imdb_list
+    whether every one of titles is in the store with the data source gave for it
     '''
-    page = urlopen(imdb_url)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    # find the list elem ('.lister-list')
-    list_items = soup.find('div', attrs={
-                           'class', 'lister-list'}).find_all('div', attrs={'class', 'lister-item'})
-    # loop thru all items in the list
-    for item in list_items:
-        # get the wrapper of the content data
-        content = item.find('div', attrs={
-                            'class', 'lister-item-content'}).find('div', attrs={'class', 'lister-col-wrapper'})
-        # access the div that contains the title
-        header_div = content.find(
-            'div', attrs={'class', 'col-title'}).find('span')
-        # access the div that contains the movie's IMDB rating
-        rating_div = content.select_one('.col-imdb-rating')
-        movie_rating = rating_div.text.strip()
-        # convert rating into a float
-        movie_rating = float(movie_rating)
-        # access the number of ratings
-        num_reviews = rating_div.select_one('strong')['title']
-        # at this point, num_reviews is formatted like this:
-        # 9.2 base on 1,512,511 votes
-        # we need to extract the 1,512,511
-        num_reviews = num_reviews.replace(str(movie_rating),'')
-
-        # base on 1,512,511
-        num_reviews = re.findall(r'(?:^|\s)(\d*\.?\d+|\d{1,3}(?:,\d{3})*(?:\.\d+)?)(?!\S)',num_reviews)[0]
-        num_reviews = int(num_reviews.replace(',',''))
-
-        # get all parts in the header_div
-        header_elems = header_div.find_all('span')
-        # access the movies rank in the list, convert to int, and strip the trailing .
-        movie_index = int(header_elems[0].text.strip('.'))
-        # finally, get the movie's title (just kidding, this is ANOTHER WRAPPER)
-        title_div = header_elems[1]
-        # there's two elements in this; the movie's title and the year it was released. we want both.
-        movie_title = title_div.find('a').text.strip()
-        # get movie year
-        movie_year = title_div.find('span').text.strip()
-        # add year to the movie title
-        display_title = ' '.join([movie_title, movie_year])
-        # construct moviedata
-        movie_data = {
-            display_title: {
-                'ranks': {
-                    'imdb': movie_index
-                },
-                'ratings': {
-                    'imdb': {
-                        'score': movie_rating,
-                        'reviews': num_reviews
-                }
-            }
-        }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        # FINALLY, add the movie to the imdb_list
-        imdb_list.append(display_title)
+    for title in titles:
+        movie = movie_store.movie(resolve_title(title))
+        if movie is None:
+            return False
+        if not any(entry.source == source for entry in (*movie.ranks, *movie.ratings)):
+            return False
+    return True
 
 
-def parse_hwood_reporter():
+def mark_source(manifest, name, page_digest, records, digest=None):
     '''
-    parse the hollywood reporter url and save movie titles to hwood_reporter_list
+    fingerprint what a source just gave us
     '''
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(hwood_reporter_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    # find the list elem ol.list--ordered__items
-    list_items = soup.find('ol').find_all('li')
-    # loop thru all items in the list
-    for item in list_items:
-        # get the bodygroup (not used yet)
-        body_div = item.find('div')
-
-        # get the headergroup
-        header_div = item.find('header')
-        # grab the movie's rank
-        movie_index = header_div.select_one('.list-item__index').text
-        movie_index = int(movie_index)
-        # the only h1 in this div is the title
-        movie_title = header_div.find('h1').text.strip()
-        # the only h2 is the year
-        movie_year = header_div.find('h2').text.strip()
-        # combine year + title to get the full name
-        display_title = ' '.join([movie_title, movie_year])
-        # construct moviedata
-        movie_data = {
-            display_title: {
-                'ranks': {
-                    'hollywood_reporter': int(movie_index)
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        hwood_reporter_list.append(display_title)
+    movies = [movie.title for _, movie in records if movie is not None]
+    manifest.mark(name, page_digest, digest or list_hash(records), site_lists[name], movies)
 
 
-def parse_empire():
+def merge_changed(name, records, page_digest=None, manifest=None):
     '''
-    parse the empire url and save movie titles to empire_list
+    merge a source's freshly parsed records, unless the manifest says they're exactly what the
+    source gave last time (its page changed, just not in any way that matters) and they're still
+    in the store; then only its list is filled in. returns whether the source changed
     '''
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(empire_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    # by far the most poorly organized page.
-    container = soup.find('div', attrs={'class', 'article__content'})
-    # everything is just on the same level
-    title_divs = container.find_all('h2')
-    for item in title_divs:
-        # parse text from the item
-        text = item.text
-        # no organization at all!! so we have to split by a . and then re-join the content
-        movie_index = text.split('.')[0]
-        movie_title = '.'.join(text.split('.')[1:]).strip()
-        # parse movie year from movie_title
-        movie_year = movie_title.split(' ')[-1].strip()
-        # remove movie year from movie_title
-        movie_title = movie_title.strip(movie_year).strip()
-        # yes, i realize that i just removed the year from the title. later on, this will (probably) be useful.
-        display_title = ' '.join([movie_title, movie_year])
-        # construct moviedata
-        movie_data = {
-            display_title: {
-                'ranks': {
-                    'empire': int(movie_index)
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        empire_list.append(display_title)
+    if manifest is None:
+        merge_records(name, records)
+        return True
+    digest = list_hash(records)
+    # anything the manifest can't vouch for counts as changed
+    unchanged = manifest.unchanged_list(name, digest, in_store)
+    if unchanged:
+        site_lists[name].extend(title for title, _ in records)
+    else:
+        merge_records(name, records)
+    mark_source(manifest, name, page_digest, records, digest)
+    return not unchanged
+
+
+def parser_pool():
+    '''
+    a pool of parser processes. they only start once the download threads are already running,
+    and forking a process that has threads can deadlock the child, so they're started from a
+    clean server process instead (or spawned, where there's no such thing)
+    '''
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context(start_method))
 
 
-def parse_tomatoes():
+def stream_and_parse(names, events, cache=None, offline=False):
     '''
-    parse the rotten tomatoes url and save movie titles to rt_list
+    download the streamable sources in names, parsing each list item as soon as it arrives.
+    a source's records are held back until it has streamed all the way through, then put on
+    events as (name, page, records, error), so a source that breaks partway leaves nothing half
+    merged. page is the whole page if there's a cache, else None
     '''
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(rt_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    # nice! the whole list is just in a table!
-    table = soup.find('table', attrs={'class': 'table'})
-    table_rows = table.find_all('tr')
-    for item in table_rows:
-        # each row is split into 4 parts; the index, rating, title, and # of ratings
-        row_parts = item.find_all('td')
-        # if the row has less than 4 items, it's not part of the movie list so we should ignore it
-        if len(row_parts) < 4:
+    from streaming import stream_all
+
+    jobs = {
+        name: (registry[name].url, registry[name].headers) + registry[name].stream[:2]
+        for name in names
+    }
+    positions = dict.fromkeys(names, 0)
+    records = {name: [] for name in names}
+    # sources that broke partway; whatever else arrives from them is ignored
+    failed = set()
+    for name, item, page, error in stream_all(jobs, cache=cache, offline=offline):
+        if name in failed:
             continue
-        # grab the index
-        movie_index = row_parts[0].text.strip('.')
-        # we need to convert this from a percentage to a decimal
-        movie_rating = row_parts[1].text.strip().replace('%','')
-        movie_rating = int(movie_rating)/10
-        # this is already formatted how we want to display it
-        display_title = row_parts[2].text.strip()
-        num_reviews = int(row_parts[3].text)
-        # movie_title contains the year in the title, so we need to split that up
-        movie_year = display_title.split(' ')[-1].strip()
-        movie_title = display_title.strip(movie_year)
-        # construct moviedata
-        movie_data = {
-            display_title: {
-                'ranks': {
-                    'rotten_tomatoes': int(movie_index)
-                },
-                'ratings': {
-                    'rotten_tomatoes': {
-                        'score': movie_rating,
-                        'reviews': num_reviews
-                    }
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        rt_list.append(display_title)
+        if item is None:
+            events.put((name, page, records.pop(name) if error is None else None, error))
+            continue
+        try:
+            record = registry[name].stream[2](item, positions[name])
+        except Exception as e:
+            # an item that changed shape shouldn't take the other lists down with it
+            failed.add(name)
+            events.put((name, None, None, e))
+            continue
+        if record is not None:
+            records[name].append(record)
+        positions[name] += 1
 
 
-def parse_wiki_gross():
+def fetch_and_parse(names=None, cache=None, offline=False, stream=False, manifest=None):
     '''
-    parse the wiki top grossing films url and save movie titles to wiki_gross_list
+    download every source (or just the ones in names) at once and hand each page to a pool of
+    parser processes as soon as it arrives, merging the records (in registry order) as the parsers
+    finish.
+    with a manifest (see fingerprint.py), a page that's the same as last time isn't parsed again
+    (its titles come straight from the manifest, its movie data is already in the store), and a
+    page that parses into the same records as last time isn't merged again.
+    with stream, the big pages are parsed item by item while they download instead, alongside
+    the rest. returns the names of the sources that changed
     '''
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(wiki_gross_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    # nice! the whole list is just in a table!
-    # table = soup.find('table', attrs={'class': 'wikitable sortable'})
-    table = soup.select_one('table.wikitable.sortable')
-    table_rows = table.find_all('tr')
-    for item in table_rows:
-        # if the first th is "Rank", this is the header row
-        if item.find('th').text.strip() == "Rank":
-            continue
-        # split that bad boi up into cells
-        row_parts = item.find_all('td')
-        movie_index = row_parts[0].text.strip()
-        movie_title = item.find('th').text.strip()
-        movie_year = row_parts[3].text.strip()
-        display_title = ' '.join([movie_title, f'({movie_year})'])
-
-        wiki_gross_list.append(capwords(display_title))
-
-
-def parse_afi():
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(afi_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    list_items = soup.select('label.container > h6.q_title')
-    for item in list_items:
-        # the title is formatted as such: "1. CITIZEN KANE (1941)" so we have to parse it
-        movie_index = item.text.split('.')[0]
-        movie_title = '.'.join(item.text.split('.')[1:]).strip()
-        # currently, i feel like the title is yelling at me. that makes me uncomfortable
-        movie_title = capwords(movie_title)
-        movie_data = {
-            movie_title: {
-                'ranks': {
-                    'afi': int(movie_index)
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        afi_list.append(capwords(movie_title))
-
-
-def parse_timeout():
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(timeout_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    list_items = soup.select(
-        '#content > article > div > div > div > div > div > article > div.card-content > header > h3 > a')
-
-    for index, item in enumerate(list_items[:-1]):
-        movie_title = item.text.strip()
-        movie_data = {
-            movie_title: {
-                'ranks': {
-                    'timeout': index+1
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        # add that bad boi to the list
-        timeout_list.append(capwords(movie_title))
-
-
-def parse_timeout_actors():
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(timeout_actors_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    list_items = soup.select(
-        '#content > article > div > div > div > div > div > article > div.card-content > header > h3 > a')
-
-    for index, item in enumerate(list_items[:-1]):
-        movie_title = item.text.strip()
-        movie_data = {
-            movie_title: {
-                'ranks': {
-                    'timeout_actors': index+1
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        # add the movie to its list
-        timeout_actors_list.append(capwords(movie_title))
-
-
-def parse_binsider():
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(binsider_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    list_items = soup.select('h2.slide-title-text')
-
-    for item in list_items:
-        # each item is formatted as such:
-        # 1. "Citizen Kane" (1941)
-        # strip the quotes and all whitespace
-        item_text = item.text.strip()
-        movie_index = item_text.split('.')[0]
-        movie_title = item_text.strip(f'{movie_index}. ').replace('"', '')
-        # construct data
-        movie_data = {
-            movie_title: {
-                'ranks': {
-                    'business_insider': int(movie_index)
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        binsider_list.append(movie_title)
-
-
-def parse_ranker():
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(ranker_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    # this one's fun. there's a lot going on in each of the list items,
-    # so we're going to have parse every element out separately.
-
-    # first, select all the containers
-    list_items = soup.select('.listItem.listItem__h2')
-
-    for item in list_items:
-        movie_index = item.select_one('.listItem__rank').text.strip()
-        movie_title = item.select_one('.listItem__title').text.strip()
-        # now try to find the year of the movie (embedded ONLY in the description)
-        movie_desc = item.select_one('.listItem__properties').text.strip()
-        # use some fancy regex to select the year
-        movie_year = re.findall(r'(\([12]\d{3}\))', movie_desc)[0]
-        # sometimes, they decide to throw the year of production into the title
-        # (because why not), so we need to account for that when adding the year ourselves.
-        movie_title = movie_title.strip(movie_year)
-        movie_title = ' '.join([movie_title, movie_year])
-        # finally, save all the movie's data and append it to the list for the site
-        movie_data = {
-            movie_title: {
-                'ranks': {
-                    'ranker': movie_index
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        ranker_list.append(movie_title)
-
-
-def parse_goodmovies():
-    hdr = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(goodmovies_url, headers=hdr)
-    page = urlopen(req)
-    # convert the page into a bowl of soup
-    soup = BeautifulSoup(page, 'html.parser')
-    list_items = soup.select('p.list_movie_name')
-    for index, item in enumerate(list_items):
-        # the movie index is stored in plaintext inside item,
-        # so we're going to just grab it from enumerate() instead
-        movie_title = item.select_one('.list_movie_localized_name').text
-        movie_year = item.find(
-            'span', attrs={'itemprop': 'datePublished'}).text
-        display_title = f'{movie_title} ({movie_year})'
-        # construct the data 'nary
-        # finally, save all the movie's data and append it to the list for the site
-        movie_data = {
-            display_title: {
-                'ranks': {
-                    'goodmovies': index+1
-                }
-            }
-        }
-        # update the movie data
-        update_movie_data(movie_data)
-        # append it to the list
-        goodmovies_list.append(display_title)
+    import queue
+    import threading
+    from concurrent.futures import as_completed
+    from fetcher import FetchError, fetch_all
+
+    changed = []
+    if names is None:
+        names = registry.keys()
+    order = list(names)
+    streamed = [name for name in order if stream and registry[name].stream]
+    jobs = {
+        name: (registry[name].url, registry[name].headers) for name in order if name not in streamed
+    }
+    # the downloads and the streams both report here, as (name, page, records, error).
+    # records is None for a page that still needs parsing
+    events = queue.Queue()
+
+    def fetch_pages():
+        try:
+            for name, page, error in fetch_all(jobs, stats=run_stats, cache=cache, offline=offline):
+                events.put((name, page, None, error))
+        finally:
+            events.put(None)
+
+    def stream_pages():
+        try:
+            stream_and_parse(streamed, events, cache, offline)
+        finally:
+            events.put(None)
+
+    producers = [threading.Thread(target=fetch_pages)]
+    if streamed:
+        producers.append(threading.Thread(target=stream_pages))
+    pending = {}
+    # the parsers finish in whatever order they like, but the records are merged in registry order,
+    # so the movie files come out the same however the downloads went.
+    # name -> (records, page digest), or None for a source with nothing to merge
+    finished = {}
+    merged = 0
+
+    def collect(futures):
+        for future in futures:
+            name, page_digest = pending.pop(future)
+            try:
+                records, parse_s, profile_file = future.result()
+            except Exception as e:
+                # a page that changed shape shouldn't take the other lists down with it
+                print(f'could not parse {name}: {e}')
+                run_stats.count('parse_errors')
+                finished[name] = None
+                continue
+            run_stats.add(name, 'parse_s', parse_s)
+            run_stats.add_profile(profile_file)
+            finished[name] = records, page_digest
+
+    def merge_ready():
+        # merge every source whose turn has come and whose records are in
+        nonlocal merged
+        while merged < len(order) and order[merged] in finished:
+            name = order[merged]
+            merged += 1
+            if finished[name] is None:
+                continue
+            records, page_digest = finished.pop(name)
+            if merge_changed(name, records, page_digest, manifest):
+                changed.append(name)
+            else:
+                run_stats.count('unchanged_sources')
+
+    with parser_pool() as pool:
+        for producer in producers:
+            producer.start()
+        running = len(producers)
+        while running:
+            event = events.get()
+            if event is None:
+                running -= 1
+                continue
+            name, page, records, error = event
+            if isinstance(error, FetchError):
+                # one dead site shouldn't take the whole run down with it
+                print(f'skipping {name}: {error}')
+                run_stats.count('fetch_errors')
+                finished[name] = None
+            elif error is not None:
+                print(f'could not parse {name}: {error}')
+                run_stats.count('parse_errors')
+                finished[name] = None
+            else:
+                page_digest = page_hash(page) if page is not None else None
+                titles = None
+                if manifest is not None and page_digest is not None:
+                    titles = manifest.unchanged_page(name, page_digest, in_store)
+                if titles is not None:
+                    site_lists[name].extend(titles)
+                    run_stats.count('unchanged_sources')
+                    finished[name] = None
+                elif records is not None:
+                    finished[name] = records, page_digest
+                else:
+                    future = pool.submit(timed_call, run_parser, name, page, profile=run_stats.profiling)
+                    pending[future] = name, page_digest
+            # merge whatever's finished while the rest are still downloading
+            collect([future for future in pending if future.done()])
+            merge_ready()
+        for future in as_completed(list(pending)):
+            collect([future])
+            merge_ready()
+        # a source that was never heard from (its producer died) is skipped, not waited on
+        for name in order[merged:]:
+            finished.setdefault(name, None)
+        merge_ready()
+    for producer in producers:
+        producer.join()
+    return changed
+
+
+def resolve_imdb_ids():
+    '''
+    look up the imdb id of every movie in the store and save it with the movie.
+    only titles that have never been looked up before actually hit imdb
+    '''
+    resolver = ImdbResolver()
+    titles = movie_store.titles()
+    for movie_title, imdb_id in resolver.resolve_all(titles).items():
+        if imdb_id is not None:
+            update_movie_data(Movie(movie_title, imdb_id=imdb_id))
+    resolver.save()
 
 
 def save_lists():
-    with open('data/lists/imdb.txt', 'w') as f:
-
-        for item in imdb_list:
-            f.write(item + '\n')
-
-    with open('data/lists/hollywood_reporter.txt', 'w') as f:
-        for item in hwood_reporter_list:
-            f.write(item + '\n')
-
-    with open('data/lists/empire.txt', 'w') as f:
-        for item in empire_list:
-            f.write(item + '\n')
-
-    with open('data/lists/tomatoes.txt', 'w') as f:
-        for item in rt_list:
-            f.write(item + '\n')
-
-    with open('data/lists/wiki_top_grossing.txt', 'w') as f:
-        for item in wiki_gross_list:
-            f.write(item + '\n')
-
-
-def main():
-    parse_imdb()
-    parse_hwood_reporter()
-    parse_empire()
-    parse_tomatoes()
-    parse_wiki_gross()
-    save_lists()
-    # add all lists to a bigger list
-    site_lists = [
-        imdb_list,
-        hwood_reporter_list,
-        empire_list,
-        rt_list,
-        wiki_gross_list
-    ]
-    # loop thru all lists and add them to master_list
-    for site_list in site_lists:
+    import export
+
+    # every source's list, not just the first five; unchanged ones are left alone
+    export.write_lists(site_lists)
 
-        for movie in site_list:
-            if movie not in master_list.keys():
-                master_list[movie] = 1
-            else:
-                master_list[movie] += 1
 
-    for movie in master_list:
-        print(movie, master_list[movie])
+def report_changes(changed):
+    '''
+    say which sources changed since the last run (everything else was skipped)
+    '''
+    for name in changed:
+        run_stats.add(name, 'changed', 1)
+    run_stats.count('changed_sources', len(changed))
+    if changed:
+        print(f'changed since the last run: {", ".join(changed)}')
+    else:
+        print('no source changed since the last run')
+
+
+def update_scores(scores, aggregate, titles):
+    '''
+    rescore the movies in titles (canonical titles whose ratings or list positions may have changed)
+    and save the scores
+    '''
+    if not scores.movies:
+        # first time scoring: everything on a list needs a score
+        titles = set(titles) | aggregate.totals.keys()
+    updated = False
+    for title in titles:
+        totals = aggregate.totals.get(title)
+        movie = movie_store.movie(title)
+        updated |= scores.update(title, movie.ratings if movie is not None else [],
+                                 totals['borda'] if totals is not None else None)
+    if updated:
+        scores.settle()
+        scores.save()
+
+
+def consensus_ranking(method='count', top=100, aggregate=None, snapshot=None):
+    '''
+    the consensus ranking by method. the totals the aggregate keeps are read straight from it,
+    and score from the scores (see scoring.py); every other method works off the ranks and ratings
+    in the snapshot (or the store, without one)
+    '''
+    if method == 'score':
+        return Scores().top(top)
+    if method in totals_kept:
+        aggregate = aggregate or Aggregate()
+        # the count ranking has always listed every movie
+        return aggregate.ranking(method, None if method == 'count' else top)
+    from ranking import RankMatrix, rank
+
+    if snapshot is not None:
+        return rank(RankMatrix.from_snapshot(snapshot), method, top)
+    return rank(RankMatrix.from_store(movie_store), method, top)
+
+
+def print_ranking(method, ranked):
+    if method == 'count':
+        for movie, count in ranked:
+            print(movie, count)
+        return
+    for position, (movie, score) in enumerate(ranked, 1):
+        print(f'{position}. {movie} ({score:g})')
+
+
+def main(offline=False, method='count', stream=False, imdb_ids=False, profile=False, reparse=False):
+    import export
+    from snapshot import export_store, snapshot_path
+
+    if profile:
+        run_stats.start_profile()
+    cache = ResponseCache()
+    manifest = SourceManifest(force=reparse)
+    aggregate = Aggregate()
+    history = History()
+    history.start_run()
+    with run_stats.stage('load'):
+        movie_store.load()
+    run_stats.count('files_read', len(movie_store.movies))
+    with run_stats.stage('fetch_and_parse'):
+        changed = fetch_and_parse(cache=cache, offline=offline, stream=stream, manifest=manifest)
+    report_changes(changed)
+    if imdb_ids:
+        with run_stats.stage('imdb_ids'):
+            resolve_imdb_ids()
+    with run_stats.stage('persist'):
+        resolve_lists()
+        # the movies merged this run might have new ratings, so they'll need rescoring
+        merged = [movie_store.movies[filename].title for filename in movie_store.dirty]
+        written = movie_store.flush()
+        run_stats.count('files_written', written)
+        if written or not os.path.exists(snapshot_path):
+            # the ranking and query tools read this instead of every movie file
+            export_store(movie_store)
+        cache.save()
+        save_lists()
+    with run_stats.stage('aggregate'):
+        # only the lists that changed (or that the aggregate has never seen) need recounting;
+        # everything else is already in the saved totals
+        recounted = aggregate.recounted
+        for name, site_list in site_lists.items():
+            if site_list and (name in changed or name not in aggregate.sources):
+                # count every spelling of a movie as the same movie
+                movies = [resolve_title(movie) for movie in site_list]
+                # a source whose ratings changed but whose list didn't has nothing to recount
+                recounted |= aggregate.update_source(name, movies) > 0
+                # only what changed since the last run gets stored
+                history.record(name, movies)
+        if recounted:
+            aggregate.save()
+        history.save()
+        master_list.update(aggregate.counts())
+    with run_stats.stage('score'):
+        # only movies with new ratings or new places on the lists get rescored
+        update_scores(Scores(), aggregate, aggregate.take_changed().union(merged))
+    with run_stats.stage('export'):
+        run_stats.count('exports_written', len(export.export_corpus()))
+    # the fingerprints go last: once they're saved, the next run skips everything they cover,
+    # so everything that follows from a changed source has to be on disk first
+    manifest.save()
+    with run_stats.stage('rank'):
+        ranked = consensus_ranking(method, aggregate=aggregate)
+    if profile:
+        run_stats.stop_profile()
+    run_stats.save()
+    print_ranking(method, ranked)
+
+
+def jittered(interval):
+    return interval * (1 + random.uniform(-daemon_jitter, daemon_jitter))
+
+
+class Daemon:
+    '''
+    keeps every list fresh: each source is refreshed on its own interval (see sources.register),
+    the corpus stays loaded in memory between refreshes, and a source is only reparsed when its
+    page changed, and only recounted when its list did
+    '''
+
+    def __init__(self, names=None, concurrency=daemon_concurrency, reparse=False):
+        self.names = list(names or registry)
+        self.concurrency = concurrency
+        # the daemon decides when a page is due, so always ask the site (a 304 is cheap)
+        self.cache = ResponseCache(ttl=0)
+        # with reparse, each source's first refresh parses and merges it no matter what
+        self.manifest = SourceManifest(force=reparse)
+        self.aggregate = Aggregate()
+        self.history = History()
+        self.scores = Scores()
+
+    async def refresh(self, name, pool):
+        '''
+        fetch one source and, if its page changed, reparse it and, if its list changed, recount it.
+        returns whether the list changed
+        '''
+        import asyncio
+        from fetcher import fetch
+
+        source = registry[name]
+        page = await asyncio.to_thread(fetch, source.url, source.headers, cache=self.cache)
+        page_digest = page_hash(page)
+        titles = self.manifest.unchanged_page(name, page_digest, in_store)
+        if titles is not None:
+            # same page as last time. right after startup the list still needs loading, though
+            if not site_lists[name]:
+                site_lists[name].extend(titles)
+            return False
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(pool, run_parser, name, page)
+        # everything from here on runs on the event loop, so two refreshes never merge at once
+        del site_lists[name][:]
+        if not merge_changed(name, records, page_digest, self.manifest):
+            # a different page, but the same list: only the new fingerprint needs saving
+            self.manifest.save()
+            self.cache.save()
+            return False
+        self.commit(name)
+        return True
+
+    def commit(self, name):
+        '''
+        write out a source's new list and recount it
+        '''
+        import export
+        from snapshot import export_store
+
+        resolve_lists()
+        merged = [movie_store.movies[filename].title for filename in movie_store.dirty]
+        movie_store.flush()
+        self.cache.save()
+        save_lists()
+        movies = [resolve_title(movie) for movie in site_lists[name]]
+        self.aggregate.update_source(name, movies)
+        self.aggregate.save()
+        self.history.start_run()
+        self.history.record(name, movies)
+        self.history.save()
+        update_scores(self.scores, self.aggregate, self.aggregate.take_changed().union(merged))
+        export_store(movie_store)
+        export.export_corpus()
+        # last, so a crash before here means the source is recounted on the next refresh
+        self.manifest.save()
+
+    async def keep_fresh(self, name, pool, limit):
+        import asyncio
+        from fetcher import FetchError
+
+        while True:
+            async with limit:
+                try:
+                    if await self.refresh(name, pool):
+                        print(f'{name} changed, recounted it')
+                except FetchError as e:
+                    print(f'skipping {name}: {e}')
+                except Exception as e:
+                    # one broken parser shouldn't stop the other sources from refreshing
+                    print(f'could not refresh {name}: {e}')
+            await asyncio.sleep(jittered(registry[name].interval))
+
+    async def run(self):
+        import asyncio
+
+        limit = asyncio.Semaphore(self.concurrency)
+        await asyncio.to_thread(movie_store.load)
+        with parser_pool() as pool:
+            await asyncio.gather(*(self.keep_fresh(name, pool, limit) for name in self.names))
+
+
+def check_method(parser, method):
+    # ranking.py (and numpy with it) is only imported when a method needs it
+    if method not in totals_kept and method != 'score':
+        from ranking import methods
+
+        if method not in methods:
+            parser.error(f'unknown ranking method {method!r} (pick from {", ".join(methods + ["score"])})')
+
+
+def fetch_command(parser, args):
+    check_method(parser, args.rank)
+    if args.daemon:
+        import asyncio
+
+        asyncio.run(Daemon(reparse=args.reparse).run())
+    else:
+        main(offline=args.offline, method=args.rank, stream=args.stream, imdb_ids=args.imdb_ids,
+             profile=args.profile, reparse=args.reparse)
+
+
+def aggregate_command(parser, args):
+    check_method(parser, args.rank)
+    snapshot = None
+    if args.rank not in totals_kept and args.rank != 'score':
+        from snapshot import Snapshot, snapshot_path
+
+        if os.path.exists(snapshot_path):
+            snapshot = Snapshot(snapshot_path)
+    print_ranking(args.rank, consensus_ranking(args.rank, args.top, snapshot=snapshot))
+
+
+def export_command(parser, args):
+    import export
+
+    formats = args.formats.split(',') if args.formats else export.formats
+    unknown = [name for name in formats if name not in export.writers]
+    if unknown:
+        parser.error(f'unknown export format {unknown[0]!r} (pick from {", ".join(export.writers)})')
+    written = export.export_corpus(formats, force=args.force)
+    for path in written:
+        print(f'wrote {path}')
+    if not written:
+        print('nothing changed')
+
+
+def query_command(parser, args):
+    import json
+    import query
+
+    if args.serve:
+        server, base_url = query.serve(port=args.port or query.default_port)
+        print(f'serving queries on {base_url}')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+    api = query.QueryApi()
+    if args.title:
+        detail = api.movie(args.title)
+        if detail is None:
+            sys.exit(f'no such movie {args.title!r}')
+        print(json.dumps(detail, indent=2))
+        return
+    try:
+        results = api.ranking(total=args.total, top=args.top, min_lists=args.min_lists,
+                              year_from=args.year_from, year_to=args.year_to, source=args.source)
+    except KeyError as e:
+        sys.exit(f'no such source {e}')
+    except ValueError as e:
+        sys.exit(str(e))
+    for position, movie, value in results:
+        print(f'{position}. {movie} ({value:g})')
+
+
+commands = {
+    'fetch': fetch_command,
+    'aggregate': aggregate_command,
+    'export': export_command,
+    'query': query_command,
+}
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='compile the top 100 movies of all time')
+    subparsers = parser.add_subparsers(dest='command', metavar='{' + ','.join(commands) + '}')
+    method_help = ('how to combine the lists: count (how many lists each movie is on), borda, mrr, '
+                   'score (see scoring.py), or any other method ranking.py offers')
+
+    fetch = subparsers.add_parser('fetch', help='scrape every list, recount and rank (the default)')
+    fetch.add_argument('--offline', action='store_true',
+                       help='only use pages that are already in the cache, never hit the network')
+    fetch.add_argument('--rank', default='count', help=method_help)
+    fetch.add_argument('--stream', action='store_true',
+                       help='parse the big lists item by item while they download (alongside the '
+                            'rest, and out of the cache when it has them)')
+    fetch.add_argument('--imdb-ids', action='store_true',
+                       help='look up (and save) the imdb id of every movie')
+    fetch.add_argument('--reparse', action='store_true',
+                       help='parse and merge every source, even the ones whose fingerprints say '
+                            'nothing changed (see fingerprint.py)')
+    fetch.add_argument('--daemon', action='store_true',
+                       help='keep running, refreshing every source on its own schedule')
+    fetch.add_argument('--profile', action='store_true',
+                       help='record the run with cProfile and tracemalloc (saved to data/run.prof '
+                            'and summarized in data/run_report.json)')
+
+    aggregate = subparsers.add_parser('aggregate', help='rank the lists saved by the last fetch')
+    aggregate.add_argument('--rank', default='count', help=method_help)
+    aggregate.add_argument('--top', type=int, default=100, help='how many movies to show')
+
+    export = subparsers.add_parser('export', help='export the corpus (see export.py)')
+    export.add_argument('--formats', help='comma separated, any of csv, jsonl or parquet '
+                                          '(default: every one that\'s installed)')
+    export.add_argument('--force', action='store_true', help='rewrite everything, changed or not')
+
+    query = subparsers.add_parser('query', help='ask the aggregated lists something (see query.py)')
+    query.add_argument('--title', help='everything about one movie, instead of the ranking')
+    query.add_argument('--total', default='count', help='count, borda or mrr')
+    query.add_argument('--top', type=int, default=100)
+    query.add_argument('--min-lists', type=int)
+    query.add_argument('--year-from', type=int)
+    query.add_argument('--year-to', type=int)
+    query.add_argument('--source', help='only movies on this source\'s list')
+    query.add_argument('--serve', action='store_true', help='serve the queries as json over http')
+    query.add_argument('--port', type=int, help='for --serve (default 8100)')
+    return parser
 
 
 if __name__ == "__main__":
-    parse_imdb()
+    argv = sys.argv[1:]
+    # no command (or just fetch's flags, like before there were commands) means fetch
+    if not argv or (argv[0] not in commands and argv[0] not in ('-h', '--help')):
+        argv = ['fetch'] + argv
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    commands[args.command](parser, args)
@@ -0,0 +1,269 @@
+"""
+fuzzy title matching, so the same movie from different sites ends up as the same movie.
+
+every site writes its titles differently: "CITIZEN KANE (1941)" gets capwords'd, business insider's
+quotes get stripped, some sites have no year at all, and "The Good, the Bad and the Ugly" shows up
+with and without its commas. TitleResolver normalizes each title, and if it's close enough to one
+it's already seen (same or neighbouring year), hands back that movie instead of making a new one.
+
+a title with no year can be any year, so it's careful with those: a yearless movie is taken over by
+the first dated title that matches it (which then becomes its canonical title, and its year its
+year), and after that it's only ever matched by titles from around that year. so "A Star Is Born"
+ends up as one of the remakes, never as all of them.
+
+to keep this fast, titles are only ever compared against movies in the same year block that share
+trigrams with them (via an inverted index), never against the whole corpus.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+from normalize import title_year_pattern
+
+# leading/trailing articles ("The Godfather", "Godfather, The")
+article_pattern = re.compile(r'^(?:the|a|an)\s+|,?\s+(?:the|a|an)$')
+# punctuation that just gets dropped ("E.T." -> "ET", "Schindler's" -> "Schindlers")
+dropped_pattern = re.compile(r"[.'’\"]")
+# everything else that isn't a letter or number (in any script) splits words
+separator_pattern = re.compile(r'[\W_]+')
+numbers_pattern = re.compile(r'\d+')
+# roman numerals up to 39, as whole words ("Part III", "Rocky IV")
+roman_pattern = re.compile(r'\b(x{0,3})(ix|iv|v?i{0,3})\b')
+roman_values = {'i': 1, 'ii': 2, 'iii': 3, 'iv': 4, 'v': 5, 'vi': 6, 'vii': 7, 'viii': 8, 'ix': 9}
+
+# how similar two titles have to be (dice coefficient of their trigrams) to count as the same movie
+default_threshold = 0.8
+
+
+def split_year(display_title):
+    '''
+    split "The Godfather (1972)" into ("The Godfather", 1972). year is None when there isn't one
+    '''
+    match = title_year_pattern.search(display_title)
+    if match is None:
+        return display_title.strip(), None
+    return display_title[:match.start()].strip(), int(match.group(1))
+
+
+def strip_accents(title):
+    decomposed = unicodedata.normalize('NFKD', title)
+    kept = []
+    for c in decomposed:
+        if unicodedata.combining(c) and kept and kept[-1].isascii():
+            continue
+        kept.append(c)
+    return unicodedata.normalize('NFKC', ''.join(kept))
+
+
+def normalize_title(title):
+    '''
+    boil a title down so formatting differences between sites don't matter:
+    "The Good, the Bad and the Ugly" -> "good the bad and the ugly"
+    '''
+    # strip accents off latin letters ("Amélie" -> "amelie"). other scripts keep theirs,
+    # since there they're part of the letter (ゴ isn't コ, й isn't и)
+    title = strip_accents(title)
+    title = title.casefold().replace('&', ' and ')
+    title = dropped_pattern.sub('', title)
+    title = separator_pattern.sub(' ', title).strip()
+    return article_pattern.sub('', title).strip()
+
+
+def title_numbers(normalized):
+    '''
+    every number in a normalized title, roman numerals included: "part iii 3d" -> [3, 3]
+    '''
+    numbers = []
+    for word in normalized.split():
+        if numbers_pattern.search(word):
+            numbers.extend(int(number) for number in numbers_pattern.findall(word))
+        else:
+            match = roman_pattern.fullmatch(word)
+            if match is not None:
+                numbers.append(10 * len(match.group(1)) + roman_values.get(match.group(2), 0))
+    return numbers
+
+
+def trigrams(normalized):
+    '''
+    the set of 3-character chunks in a normalized title (padded so short titles still get some)
+    '''
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleResolver:
+    '''
+    hands out one canonical display title per movie, no matter how a site spelled it
+    '''
+
+    def __init__(self, threshold=default_threshold):
+        self.threshold = threshold
+        # canonical id -> canonical display title
+        self.titles = []
+        # per canonical id: (trigram count, year, numbers in the title)
+        self.info = []
+        # (normalized title, year) -> canonical id, for exact matches
+        self.exact = {}
+        # year -> trigram -> list of canonical ids with that trigram
+        self.blocks = defaultdict(lambda: defaultdict(list))
+        # trigram -> list of canonical ids, across every year (for titles with no year)
+        self.everything = defaultdict(list)
+        # every display title we've already resolved -> canonical id
+        self.seen = {}
+        # (old, new) canonical titles of yearless movies that got a year since take_retitled()
+        self.retitled = []
+        self.seeded = False
+
+    def seed(self, display_titles):
+        '''
+        load titles we already know about (e.g. everything in the movie store).
+        dated titles go first, so they're the canonical ones
+        '''
+        for display_title in sorted(display_titles, key=lambda title: split_year(title)[1] is None):
+            self.resolve(display_title)
+        self.seeded = True
+
+    def canonical_id(self, display_title):
+        '''
+        get the canonical id for a display title, adding a new movie if nothing matches
+        '''
+        movie_id = self.seen.get(display_title)
+        if movie_id is not None:
+            return movie_id
+        title, year = split_year(display_title)
+        normalized = normalize_title(title)
+        if not normalized:
+            # nothing left to compare ("!!!"), so it's only ever the same movie as itself
+            movie_id = self.add(display_title, normalized, year)
+            self.seen[display_title] = movie_id
+            return movie_id
+        movie_id = self.exact.get((normalized, year))
+        if movie_id is None:
+            movie_id = self.match(normalized, year)
+            if movie_id is not None and year is not None and self.info[movie_id][1] is None:
+                self.date(movie_id, display_title, year)
+        if movie_id is None:
+            movie_id = self.add(display_title, normalized, year)
+        self.exact.setdefault((normalized, year), movie_id)
+        self.seen[display_title] = movie_id
+        return movie_id
+
+    def resolve(self, display_title):
+        '''
+        get the canonical display title for a display title
+        '''
+        return self.titles[self.canonical_id(display_title)]
+
+    def add(self, display_title, normalized, year):
+        movie_id = len(self.titles)
+        grams = trigrams(normalized)
+        self.titles.append(display_title)
+        self.info.append((len(grams), year, title_numbers(normalized)))
+        if not normalized:
+            # never a candidate for anything else
+            return movie_id
+        for gram in grams:
+            self.blocks[year][gram].append(movie_id)
+            self.everything[gram].append(movie_id)
+        return movie_id
+
+    def date(self, movie_id, display_title, year):
+        '''
+        give a yearless movie the year (and the display title) of the dated title that matched it,
+        so it stops being a candidate for every other year
+        '''
+        gram_count, _, numbers = self.info[movie_id]
+        self.info[movie_id] = (gram_count, year, numbers)
+        for gram in trigrams(normalize_title(self.titles[movie_id])):
+            self.blocks[None][gram].remove(movie_id)
+            self.blocks[year][gram].append(movie_id)
+        self.retitled.append((self.titles[movie_id], display_title))
+        self.titles[movie_id] = display_title
+
+    def take_retitled(self):
+        '''
+        the (old, new) canonical titles that changed since the last call
+        '''
+        retitled, self.retitled = self.retitled, []
+        return retitled
+
+    def match(self, normalized, year):
+        '''
+        find the closest known movie to a normalized title, or None if nothing is close enough
+        '''
+        grams = trigrams(normalized)
+        # count how many trigrams every candidate shares with us
+        shared = defaultdict(int)
+        if year is None:
+            indexes = [self.everything]
+        else:
+            # sites disagree on release years by one sometimes, and some don't give one at all.
+            # a yearless movie is only in the None block until a dated title takes it over
+            indexes = [self.blocks[y] for y in (year - 1, year, year + 1, None) if y in self.blocks]
+        for index in indexes:
+            for gram in grams:
+                for movie_id in index.get(gram, ()):
+                    shared[movie_id] += 1
+        numbers = title_numbers(normalized)
+        best_id = None
+        best_score = self.threshold
+        for movie_id, count in shared.items():
+            gram_count, other_year, other_numbers = self.info[movie_id]
+            # "Toy Story 2" is not "Toy Story 3", and "Part II" is not "Part III",
+            # no matter how similar the rest of it is
+            if numbers != other_numbers:
+                continue
+            score = 2 * count / (len(grams) + gram_count)
+            # an exact year match breaks ties
+            if score > best_score or (score == best_score and other_year == year):
+                best_id = movie_id
+                best_score = score
+        return best_id
+
+
+if __name__ == "__main__":
+    # titles that have to end up as the same movie, and ones that mustn't
+    same = [
+        ('The Good, the Bad and the Ugly (1966)', 'Good the Bad and the Ugly, The (1966)'),
+        ('E.T. the Extra-Terrestrial (1982)', 'ET The Extra Terrestrial (1982)'),
+        ('Amélie (2001)', 'Amelie (2001)'),
+        ('Back to the Future Part III (1990)', 'Back to the Future Part 3 (1990)'),
+        ('ゴジラ (1954)', 'ゴジラ (1955)'),
+    ]
+    different = [
+        ('Toy Story 2 (1999)', 'Toy Story 3 (1999)'),
+        ('Back to the Future Part II (1989)', 'Back to the Future Part III (1990)'),
+        ('Rocky (1976)', 'Rocky II (1977)'),
+        ('ゴジラ (1954)', '七人の侍 (1954)'),
+        ('Сибирский цирюльник (1998)', 'Брат (1997)'),
+        ('!!! (1990)', '??? (1990)'),
+        ('A Star Is Born (1954)', 'A Star Is Born (2018)'),
+        ('Psycho (1960)', 'Psycho (1998)'),
+    ]
+    # the same, with a yearless title seen first: it can only ever join one of them
+    yearless = [
+        ('A Star Is Born', 'A Star Is Born (1954)', 'A Star Is Born (2018)'),
+        ('Psycho', 'Psycho (1960)', 'Psycho (1998)'),
+    ]
+    failed = 0
+    for first, second, expected in [pair + (True,) for pair in same] + [pair + (False,) for pair in different]:
+        resolver = TitleResolver()
+        resolver.resolve(first)
+        if (resolver.resolve(second) == first) != expected:
+            failed += 1
+            print(f'{"should" if expected else "should not"} match: {first!r} / {second!r}')
+    for bare, first, second in yearless:
+        resolver = TitleResolver()
+        resolver.resolve(bare)
+        resolved = [resolver.resolve(first), resolver.resolve(second), resolver.resolve(bare)]
+        # the dated titles stay apart, and the yearless one goes with the first and takes its year
+        if resolved != [first, second, first]:
+            failed += 1
+            print(f'should not match: {first!r} / {second!r} (after {bare!r}): {resolved}')
+        resolver = TitleResolver()
+        resolver.seed([bare, first, second])
+        if [resolver.resolve(title) for title in (bare, first, second)] != [first, first, second]:
+            failed += 1
+            print(f'seeding {bare!r} with {first!r} and {second!r} gave the wrong canonical titles')
+    print(f'{failed} of {len(same) + len(different) + 2 * len(yearless)} failed')
@@ -0,0 +1,94 @@
+"""
+shared text normalization for the parsers and the store.
+
+everything in here runs once per movie per list, so the regexes are compiled once, the filename
+translation table is built once, and slugify/title_case remember the titles they've already seen
+(the same few hundred movies come up on list after list).
+"""
+import re
+from functools import lru_cache
+from string import capwords
+
+# illegal chars list for filenames
+illegal_chars = [
+    '!',
+    ',',
+    '-',
+    '&',
+    '?',
+    '/',
+    '\\',
+    "'",
+    ':',
+    '.',
+    '—',
+    '·'
+]
+# str.translate() table that deletes every illegal char
+illegal_table = str.maketrans('', '', ''.join(illegal_chars))
+
+# a vote count like 1,512,511 in imdb's "9.2 base on 1,512,511 votes"
+votes_pattern = re.compile(r'(?:^|\s)(\d*\.?\d+|\d{1,3}(?:,\d{3})*(?:\.\d+)?)(?!\S)')
+# a year in parens somewhere in a description, like ranker's "... (1994) ..."
+year_pattern = re.compile(r'(\([12]\d{3}\))')
+# the year at the very end of a display title, like "The Godfather (1972)"
+title_year_pattern = re.compile(r'\s*\((\d{4})\)\s*$')
+
+
+@lru_cache(maxsize=4096)
+def slugify(movie_title):
+    '''
+    turn a display title like "The Godfather (1972)" into its datafile name
+    '''
+    # remove all bad chars
+    filename = movie_title.translate(illegal_table)
+    # replace all the double spaces
+    filename = filename.replace('  ', ' ')
+    filename = filename.replace(' ', '_')
+    return filename.lower() + '.json'
+
+
+@lru_cache(maxsize=4096)
+def title_case(title):
+    '''
+    string.capwords, but it remembers
+    '''
+    return capwords(title)
+
+
+def join_year(title, year):
+    '''
+    stick the year onto the title: ("The Godfather", "(1972)") -> "The Godfather (1972)"
+    '''
+    return ' '.join([title, year])
+
+
+def split_index(text):
+    '''
+    split a numbered heading like "1. CITIZEN KANE (1941)" into ("1", "CITIZEN KANE (1941)")
+    '''
+    index, _, rest = text.partition('.')
+    return index, rest.strip()
+
+
+def parse_votes(text, rating):
+    '''
+    pull the vote count out of imdb's rating tooltip ("9.2 base on 1,512,511 votes" -> 1512511)
+    '''
+    # take the rating out first so it isn't mistaken for the vote count
+    text = text.replace(str(rating), '')
+    return int(votes_pattern.findall(text)[0].replace(',', ''))
+
+
+def find_year(text):
+    '''
+    the first "(1994)"-style year in text
+    '''
+    return year_pattern.findall(text)[0]
+
+
+def percent_to_score(text):
+    '''
+    turn a percentage like "98%" into a score out of 10
+    '''
+    return int(text.strip().replace('%', '')) / 10
@@ -0,0 +1,51 @@
+"""
+soup-making helpers for the parsers.
+
+html.parser is pure python and the slowest backend bs4 has, and every parser was using it to build
+a tree of the entire page (nav, ads, footers, all of it) just to get at one list. make_soup() uses
+lxml when it's installed and only builds the part of the page the parser asked for.
+"""
+import importlib.util
+import re
+
+# bs4 (and lxml under it) take a while to import, and only the parsers need them, so they're
+# imported the first time a page is actually parsed rather than whenever sources.py is
+fast_backend = 'lxml' if importlib.util.find_spec('lxml') is not None else None
+
+# which tree builder to use. None means the fastest one that's installed
+backend = None
+# set to False to always build the whole page, like the parsers used to
+strain = True
+
+
+def has_class(name):
+    '''
+    match an element with the css class name.
+    SoupStrainer sees the raw class attribute ("listItem listItem__h2") while the page is being
+    parsed, so class_='listItem__h2' on its own would never match an element with more than one class
+    '''
+    return re.compile(r'(?:^|\s)' + re.escape(name) + r'(?:\s|$)')
+
+
+def only(name=None, class_name=None, **attrs):
+    '''
+    build a SoupStrainer that keeps only the matching elements (and everything inside them)
+    '''
+    from bs4 import SoupStrainer
+
+    if class_name is not None:
+        attrs['class'] = has_class(class_name)
+    return SoupStrainer(name, attrs=attrs)
+
+
+def make_soup(page, parse_only=None):
+    '''
+    convert the page into a bowl of soup, using the fastest backend available.
+    if parse_only is given (see only()), everything outside of it is thrown away while parsing
+    '''
+    from bs4 import BeautifulSoup
+
+    features = backend or fast_backend or 'html.parser'
+    if not strain:
+        parse_only = None
+    return BeautifulSoup(page, features, parse_only=parse_only)
@@ -0,0 +1,274 @@
+"""
+read-only queries over the aggregated lists.
+
+instead of scraping what main() prints or reading data/lists/, ask for what you need: the consensus
+ranking (by count, borda or mrr), one movie's details, one source's list, and filters on top of
+the ranking (release years, minimum number of lists, only movies on a given source).
+
+every answer comes out of indexes built in memory from data/aggregate.json and the corpus snapshot
+(see snapshot.py): each ranking pre-sorted, each movie's position in it, movies bucketed by year,
+and source -> movies. they're only rebuilt when one of those two files changes on disk.
+
+use QueryApi from python, or serve it as json over http:
+    python query.py [--port 8100]
+
+    GET /ranking?total=count&top=100&min_lists=2&year_from=1990&year_to=1999&source=imdb
+    GET /movie?title=The Godfather (1972)
+    GET /sources
+    GET /sources/<name>
+"""
+import argparse
+import bisect
+import heapq
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from aggregate import Aggregate, aggregate_path, totals_kept
+from matcher import split_year
+from snapshot import Snapshot, snapshot_path
+
+# default port for the http service
+default_port = 8100
+# how often (seconds) the files are checked for changes, at most
+check_every = 1.0
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class Index:
+    '''
+    everything the queries need, built once from an aggregate (and a snapshot for the details)
+    '''
+
+    def __init__(self, aggregate, snapshot=None):
+        self.snapshot = snapshot
+        self.counts = aggregate.counts()
+        # total -> movies, best first, and the matching values
+        self.orders = {}
+        self.values = {}
+        # total -> movie -> its position in orders[total]
+        self.positions = {}
+        # total -> year -> positions of the movies from that year, in order
+        self.year_buckets = {}
+        self.years = {movie: split_year(movie)[1] for movie in self.counts}
+        for total in totals_kept:
+            ranking = aggregate.ranking(total)
+            self.orders[total] = [movie for movie, _ in ranking]
+            self.values[total] = [value for _, value in ranking]
+            self.positions[total] = {movie: i for i, movie in enumerate(self.orders[total])}
+            buckets = {}
+            for i, movie in enumerate(self.orders[total]):
+                buckets.setdefault(self.years[movie], []).append(i)
+            self.year_buckets[total] = buckets
+        # every year that has a movie, sorted, for range lookups
+        self.sorted_years = sorted(year for year in self.year_buckets.get('count', {}) if year is not None)
+        # source -> its list (best first), and source -> the set of movies on it
+        self.source_lists = {
+            source: sorted(ranks, key=ranks.get) for source, ranks in aggregate.sources.items()
+        }
+        self.source_ranks = aggregate.sources
+        self.by_source = {source: set(ranks) for source, ranks in aggregate.sources.items()}
+
+    def ranking(self, total='count', top=100, min_lists=None, year_from=None, year_to=None,
+                source=None):
+        '''
+        [(position, movie, value)], best first, with the filters applied.
+        position is the movie's place in the unfiltered ranking
+        '''
+        if total not in self.orders:
+            raise ValueError(f'unknown total {total!r} (pick from {", ".join(totals_kept)})')
+        if source is not None and source not in self.by_source:
+            raise KeyError(source)
+        order = self.orders[total]
+        if year_from is not None or year_to is not None:
+            # only walk the movies from the years asked for, merged back into ranking order
+            lo = 0 if year_from is None else bisect.bisect_left(self.sorted_years, year_from)
+            hi = len(self.sorted_years) if year_to is None else bisect.bisect_right(self.sorted_years, year_to)
+            buckets = self.year_buckets[total]
+            candidates = heapq.merge(*(buckets[year] for year in self.sorted_years[lo:hi]))
+        else:
+            candidates = range(len(order))
+        on_source = self.by_source[source] if source is not None else None
+        results = []
+        for i in candidates:
+            movie = order[i]
+            if min_lists is not None and self.counts[movie] < min_lists:
+                if total == 'count':
+                    # the count ranking is sorted by exactly this, so nothing after here qualifies
+                    break
+                continue
+            if on_source is not None and movie not in on_source:
+                continue
+            results.append((i + 1, movie, self.values[total][i]))
+            if top is not None and len(results) >= top:
+                break
+        return results
+
+    def movie(self, title):
+        '''
+        everything we know about one movie, or None
+        '''
+        if title not in self.counts:
+            return None
+        detail = {
+            'title': title,
+            'year': self.years[title],
+            'totals': {total: self.values[total][self.positions[total][title]] for total in totals_kept},
+            'positions': {total: self.positions[total][title] + 1 for total in totals_kept},
+            'lists': {
+                source: ranks[title] for source, ranks in self.source_ranks.items() if title in ranks
+            },
+        }
+        row = self.snapshot.row(title) if self.snapshot is not None else None
+        if row is not None:
+            data = self.snapshot.movie(row).to_data()[title]
+            detail.update({key: value for key, value in data.items() if key != 'ranks'})
+            detail['site_ranks'] = data.get('ranks', {})
+        return detail
+
+    def source_list(self, source):
+        '''
+        a source's list as canonical titles, best first
+        '''
+        return self.source_lists[source]
+
+
+class QueryApi:
+    '''
+    the queries, over an Index that's swapped out for a fresh one whenever the aggregate
+    or the snapshot changes on disk. safe to share between threads
+    '''
+
+    def __init__(self, aggregate_path=aggregate_path, snapshot_path=snapshot_path):
+        self.aggregate_path = aggregate_path
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self.version = None
+        self.index = None
+        self.checked = 0
+        self.refresh()
+
+    def refresh(self):
+        '''
+        rebuild the index if the files it was built from changed. returns the current index
+        '''
+        now = time.monotonic()
+        if self.index is not None and now - self.checked < check_every:
+            return self.index
+        with self._lock:
+            self.checked = now
+            version = (mtime(self.aggregate_path), mtime(self.snapshot_path))
+            if version != self.version:
+                snapshot = Snapshot(self.snapshot_path) if version[1] is not None else None
+                # readers keep using the old index until the new one is completely built
+                self.index = Index(Aggregate(self.aggregate_path), snapshot)
+                self.version = version
+        return self.index
+
+    def ranking(self, **filters):
+        return self.refresh().ranking(**filters)
+
+    def movie(self, title):
+        return self.refresh().movie(title)
+
+    def sources(self):
+        return sorted(self.refresh().source_lists)
+
+    def source_list(self, source):
+        return self.refresh().source_list(source)
+
+
+def int_param(params, name):
+    values = params.get(name)
+    return int(values[0]) if values else None
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    '''
+    json over http for a QueryApi (set as api on a subclass, see serve())
+    '''
+    api = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            if parts == ['ranking']:
+                results = self.api.ranking(
+                    total=params.get('total', ['count'])[0],
+                    top=int_param(params, 'top') or 100,
+                    min_lists=int_param(params, 'min_lists'),
+                    year_from=int_param(params, 'year_from'),
+                    year_to=int_param(params, 'year_to'),
+                    source=params.get('source', [None])[0]
+                )
+                body = [{'position': p, 'title': t, 'value': v} for p, t, v in results]
+            elif parts == ['movie'] and 'title' in params:
+                body = self.api.movie(params['title'][0])
+                if body is None:
+                    return self.send_json(404, {'error': 'no such movie'})
+            elif parts == ['sources']:
+                body = self.api.sources()
+            elif len(parts) == 2 and parts[0] == 'sources':
+                body = self.api.source_list(parts[1])
+            else:
+                return self.send_json(404, {'error': 'not found'})
+        except KeyError as e:
+            return self.send_json(404, {'error': f'no such source {e}'})
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # keep quiet, nobody wants a log line per request
+        pass
+
+
+class QueryServer(ThreadingHTTPServer):
+    # the default backlog of 5 makes a burst of clients wait on tcp retries
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def serve(api=None, port=default_port):
+    '''
+    start the http service in a background thread. returns (server, base_url);
+    call server.shutdown() when done
+    '''
+    handler = type('BoundQueryHandler', (QueryHandler,), {'api': api or QueryApi()})
+    server = QueryServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='serve the aggregated lists as json')
+    parser.add_argument('--port', type=int, default=default_port)
+    args = parser.parse_args()
+    server, base_url = serve(port=args.port)
+    print(f'serving queries on {base_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
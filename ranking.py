@@ -0,0 +1,220 @@
+"""
+consensus ranking over every source's list.
+
+counting how many lists a movie shows up on is a start, but it throws away where on each list it
+showed up. this builds a movies x sources matrix of ranks (and ratings) out of the movie store and
+scores every movie in one go with numpy, using whichever aggregate you ask for:
+
+    count    how many lists the movie is on (what main() has always done)
+    borda    borda count, normalized by list length so the 250-movie lists don't drown out the rest
+    mrr      mean reciprocal rank across every list
+    rating   review-count-weighted average of the movie's ratings
+    kemeny   kemeny-style consensus: borda order, then adjacent swaps wherever most lists disagree,
+             over the top kemeny_window movies of it
+
+usage: python ranking.py [method] [--top N] [--snapshot [path]]
+"""
+import argparse
+
+import numpy as np
+
+from records import RankTable
+
+# the aggregates, in the order they're offered on the command line
+methods = ['count', 'borda', 'mrr', 'rating', 'kemeny']
+# how much of the borda order kemeny reorders. the swaps are what cost, so this is what keeps it
+# well under a second however big the corpus gets; the movies below it keep their borda order
+kemeny_window = 5000
+
+
+class RankMatrix:
+    '''
+    every movie's rank and rating on every source, as numpy arrays.
+    ranks is movies x sources with nan where a movie isn't on a list;
+    scores and reviews are movies x rating sources, same deal
+    '''
+
+    def __init__(self, titles, sources, ranks, rating_sources, scores, reviews):
+        self.titles = titles
+        self.sources = sources
+        self.ranks = ranks
+        self.rating_sources = rating_sources
+        self.scores = scores
+        self.reviews = reviews
+
+    @classmethod
+    def from_records(cls, movies):
+        '''
+        build the matrix from records.Movie's. the ranks come straight out of a RankTable's
+        arrays, no per-cell copying
+        '''
+        movies = list(movies)
+        table = RankTable.from_movies(movies)
+        ranks = np.full((len(table.titles), len(table.columns)), np.nan)
+        for col, column in enumerate(table.columns.values()):
+            ranks[:, col] = np.frombuffer(column, dtype=np.float64)
+        rating_sources = {}
+        rating_cells = []
+        for row, movie in enumerate(movies):
+            for rating in movie.ratings:
+                col = rating_sources.setdefault(rating.source, len(rating_sources))
+                rating_cells.append((row, col, rating.score, rating.reviews))
+        scores = np.full((len(movies), len(rating_sources)), np.nan)
+        reviews = np.zeros((len(movies), len(rating_sources)))
+        if rating_cells:
+            rows, cols, score_values, review_values = zip(*rating_cells)
+            scores[list(rows), list(cols)] = [np.nan if v is None else v for v in score_values]
+            reviews[list(rows), list(cols)] = [0 if v is None else v for v in review_values]
+        return cls(table.titles, list(table.columns), ranks, list(rating_sources), scores, reviews)
+
+    @classmethod
+    def from_store(cls, store):
+        '''
+        build the matrix from everything in a store.MovieStore
+        '''
+        store.load()
+        return cls.from_records(store.movies.values())
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        '''
+        use a snapshot.Snapshot's columns as-is: nothing is parsed or copied
+        '''
+        return cls(snapshot.titles, snapshot.sources, snapshot.ranks, snapshot.rating_sources,
+                   snapshot.scores, snapshot.reviews)
+
+
+def count(matrix):
+    '''
+    how many lists every movie is on
+    '''
+    return (~np.isnan(matrix.ranks)).sum(axis=1).astype(float)
+
+
+def borda(matrix):
+    '''
+    sum over lists of (list length - rank + 1) / list length, so #1 on any list is worth 1 point
+    '''
+    # fmax skips the nans, and the points are worked out in place: this is run over every cell
+    lengths = np.fmax.reduce(matrix.ranks, axis=0, initial=0)
+    lengths[lengths == 0] = 1
+    points = lengths - matrix.ranks
+    points += 1
+    points /= lengths
+    points[np.isnan(matrix.ranks)] = 0
+    return points.sum(axis=1)
+
+
+def mrr(matrix):
+    '''
+    mean reciprocal rank, counting lists a movie isn't on as 0
+    '''
+    if not matrix.sources:
+        return np.zeros(len(matrix.titles))
+    reciprocal = np.reciprocal(matrix.ranks, where=matrix.ranks > 0, out=np.zeros_like(matrix.ranks))
+    return reciprocal.sum(axis=1) / len(matrix.sources)
+
+
+def rating(matrix):
+    '''
+    average of every rating the movie has, weighted by log(number of reviews) so a score
+    from a million votes counts for more than one from a dozen
+    '''
+    rated = ~np.isnan(matrix.scores)
+    weights = np.where(rated, np.log1p(matrix.reviews), 0)
+    total = weights.sum(axis=1)
+    weighted = np.where(rated, matrix.scores, 0) * weights
+    return np.divide(weighted.sum(axis=1), total, out=np.zeros(len(matrix.titles)), where=total > 0)
+
+
+def kemeny(matrix, passes=1000, window=None):
+    '''
+    approximate the kemeny consensus: start from the borda order, then keep swapping neighbours
+    whenever more lists prefer the lower one, until nothing moves (a locally kemeny-optimal order).
+    only the top window (kemeny_window by default) of the borda order gets reordered; everything
+    below it keeps its borda place. swaps happen in odd/even rounds so each round is a single
+    vector op, and after the first round only the pairs next to a swap get looked at again
+    '''
+    window = kemeny_window if window is None else window
+    order = np.argsort(-borda(matrix), kind='stable')
+    head = order[:window]
+    rows = matrix.ranks[head]
+    ranked = ~np.isnan(rows)
+    # nearly all the time goes on pulling pairs of rows out of ranks and comparing them, so the
+    # ranks are kept as the smallest ints they fit in. unranked movies get the biggest int,
+    # so they lose to every ranked one
+    biggest = rows.max(initial=0, where=ranked)
+    dtype = np.uint16 if biggest < np.iinfo(np.uint16).max else np.uint32
+    ranks = np.where(ranked, rows, np.iinfo(dtype).max).astype(dtype)
+    # positions in head, reordered in place
+    local = np.arange(len(head))
+    # active[i] means the pair (local[i], local[i + 1]) needs checking
+    active = np.ones(max(len(local) - 1, 0), dtype=bool)
+    for _ in range(passes):
+        moved = False
+        for parity in (0, 1):
+            idx = np.flatnonzero(active[parity::2]) * 2 + parity
+            if not len(idx):
+                continue
+            active[idx] = False
+            above = ranks[local[idx]]
+            below = ranks[local[idx + 1]]
+            # how many more lists put the lower movie ahead of the higher one than the other way
+            # round. bools are bytes, so the difference is taken as int8 and summed wider
+            margin = (below < above).view(np.int8) - (above < below).view(np.int8)
+            swapped = idx[margin.sum(axis=1, dtype=np.int32) > 0]
+            if not len(swapped):
+                continue
+            moved = True
+            local[swapped], local[swapped + 1] = local[swapped + 1], local[swapped]
+            # the pairs on either side of a swap have new neighbours now
+            active[swapped[swapped > 0] - 1] = True
+            after = swapped + 1
+            active[after[after < len(active)]] = True
+        if not moved:
+            break
+    order[:len(head)] = head[local]
+    # hand back scores like the other methods: higher is better
+    scores = np.empty(len(order))
+    scores[order] = np.arange(len(order), 0, -1)
+    return scores
+
+
+aggregates = {
+    'count': count,
+    'borda': borda,
+    'mrr': mrr,
+    'rating': rating,
+    'kemeny': kemeny,
+}
+
+
+def rank(matrix, method='count', top=None):
+    '''
+    score every movie with method and return (title, score) pairs, best first
+    '''
+    scores = aggregates[method](matrix)
+    order = np.argsort(-scores, kind='stable')
+    if top is not None:
+        order = order[:top]
+    return [(matrix.titles[i], float(scores[i])) for i in order]
+
+
+if __name__ == "__main__":
+    from snapshot import Snapshot, snapshot_path
+    from store import MovieStore
+
+    parser = argparse.ArgumentParser(description='consensus ranking over the movie store')
+    parser.add_argument('method', nargs='?', default='count', choices=methods,
+                        help=f'kemeny only reorders the top {kemeny_window} movies of the borda order')
+    parser.add_argument('--top', type=int, default=100, help='how many movies to show')
+    parser.add_argument('--snapshot', nargs='?', const=snapshot_path,
+                        help=f'read the corpus from a binary snapshot (default {snapshot_path}) '
+                             'instead of the movie files')
+    args = parser.parse_args()
+    if args.snapshot:
+        matrix = RankMatrix.from_snapshot(Snapshot(args.snapshot))
+    else:
+        matrix = RankMatrix.from_store(MovieStore())
+    for position, (title, score) in enumerate(rank(matrix, args.method, args.top), 1):
+        print(f'{position}. {title} ({score:g})')
@@ -0,0 +1,244 @@
+"""
+typed movie records.
+
+a movie used to be a nested 'nary like {title: {'ranks': {...}, 'ratings': {...}}}, built fresh by
+every parser for every movie and merged with a recursive walk. these are small __slots__ classes
+instead: merging two movies is a flat walk over a handful of rank and rating entries, and to_data()
+turns a movie back into exactly the json the movie files have always had.
+
+RankTable keeps every source's ranks in a flat array of doubles (nan where a movie isn't on the
+list), so numpy can read them without copying.
+"""
+import collections.abc
+from array import array
+
+from normalize import slugify
+
+nan = float('nan')
+
+
+def update(orig, new):
+    '''
+    helper function to assist in updating nested dictionaries
+    '''
+    for k, v in new.items():
+        if isinstance(v, collections.abc.Mapping):
+            orig[k] = update(orig.get(k, {}), v)
+        else:
+            orig[k] = v
+    return orig
+
+
+class MovieKey:
+    '''
+    a movie's display title ("The Godfather (1972)") and the datafile name it's stored under
+    '''
+    __slots__ = ('display', 'filename')
+
+    def __init__(self, display):
+        self.display = display
+        self.filename = slugify(display)
+
+    def __eq__(self, other):
+        return isinstance(other, MovieKey) and self.filename == other.filename
+
+    def __hash__(self):
+        return hash(self.filename)
+
+    def __repr__(self):
+        return f'MovieKey({self.display!r})'
+
+
+class RankEntry:
+    '''
+    where a movie sits on one source's list. rank is kept exactly as the site gave it
+    (ranker's are strings)
+    '''
+    __slots__ = ('source', 'rank')
+
+    def __init__(self, source, rank):
+        self.source = source
+        self.rank = rank
+
+    def __repr__(self):
+        return f'RankEntry({self.source!r}, {self.rank!r})'
+
+
+class Rating:
+    '''
+    one source's score for a movie, and how many reviews it's based on
+    '''
+    __slots__ = ('source', 'score', 'reviews')
+
+    def __init__(self, source, score=None, reviews=None):
+        self.source = source
+        self.score = score
+        self.reviews = reviews
+
+    def __repr__(self):
+        return f'Rating({self.source!r}, {self.score!r}, {self.reviews!r})'
+
+
+def merge_entries(entries, new_entries):
+    '''
+    replace (or add) entries by source. there's never more than a few, so a scan beats a 'nary
+    '''
+    for new in new_entries:
+        for i, entry in enumerate(entries):
+            if entry.source == new.source:
+                entries[i] = new
+                break
+        else:
+            entries.append(new)
+    return entries
+
+
+class Movie:
+    '''
+    everything we know about one movie.
+    fields keeps the top-level keys in the order they were first seen, so to_data() writes them back
+    in the same order a 'nary merge would have: 'ranks' holds RankEntry's, 'ratings' holds Rating's,
+    and anything else (gross, imdb_id...) is kept as-is
+    '''
+    __slots__ = ('key', 'fields')
+
+    def __init__(self, title, ranks=None, ratings=None, **extra):
+        self.key = title if isinstance(title, MovieKey) else MovieKey(title)
+        self.fields = {}
+        if ranks:
+            self.fields['ranks'] = list(ranks)
+        if ratings:
+            self.fields['ratings'] = list(ratings)
+        self.fields.update(extra)
+
+    @property
+    def title(self):
+        return self.key.display
+
+    @property
+    def ranks(self):
+        return self.fields.get('ranks', ())
+
+    @property
+    def ratings(self):
+        return self.fields.get('ratings', ())
+
+    def retitled(self, title):
+        '''
+        the same movie filed under a different display title
+        '''
+        movie = self.copy()
+        movie.key = MovieKey(title)
+        return movie
+
+    def copy(self):
+        movie = Movie(self.key)
+        movie.merge(self)
+        return movie
+
+    def merge(self, other):
+        '''
+        merge other's data into this movie. entries from other win, like update() did
+        '''
+        for name, value in other.fields.items():
+            if name in ('ranks', 'ratings'):
+                self.fields[name] = merge_entries(self.fields.get(name, []), value)
+            elif isinstance(value, dict):
+                # nothing we write nests deeper than ranks and ratings, but keep whatever's there
+                self.fields[name] = update(self.fields.get(name, {}), value)
+            else:
+                self.fields[name] = value
+        return self
+
+    def to_data(self):
+        '''
+        the movie as a data 'nary, in the format the movie files use
+        '''
+        movie = {}
+        for name, value in self.fields.items():
+            if name == 'ranks':
+                movie[name] = {entry.source: entry.rank for entry in value}
+            elif name == 'ratings':
+                movie[name] = {
+                    rating.source: {'score': rating.score, 'reviews': rating.reviews}
+                    for rating in value
+                }
+            else:
+                movie[name] = value
+        return {self.key.display: movie}
+
+    @classmethod
+    def from_data(cls, data):
+        '''
+        build a movie from a data 'nary (see update_movie_data).
+        older datafiles can hold a second spelling of the title as another top-level key (two
+        titles that slugify to the same file); those get folded into the first one
+        '''
+        titles = list(data.keys())
+        movie = cls(titles[0])
+        for title in titles:
+            spelling = cls(movie.key)
+            for name, value in data[title].items():
+                if name == 'ranks':
+                    spelling.fields[name] = [RankEntry(source, rank) for source, rank in value.items()]
+                elif name == 'ratings':
+                    spelling.fields[name] = [
+                        Rating(source, rating.get('score'), rating.get('reviews'))
+                        for source, rating in value.items()
+                    ]
+                else:
+                    spelling.fields[name] = value
+            if len(titles) == 1:
+                return spelling
+            movie.merge(spelling)
+        return movie
+
+    def __repr__(self):
+        return f'Movie({self.key.display!r}, {self.fields!r})'
+
+
+def to_number(rank):
+    '''
+    ranks from some sites (ranker...) are strings; anything unusable counts as unranked
+    '''
+    try:
+        return float(rank)
+    except (TypeError, ValueError):
+        return nan
+
+
+class RankTable:
+    '''
+    every movie's rank on every source. each source is a column: a flat array of doubles
+    with one slot per movie, nan where the movie isn't on that list
+    '''
+
+    def __init__(self):
+        self.titles = []
+        # source -> array('d') of ranks, one per title
+        self.columns = {}
+
+    def add(self, movie):
+        '''
+        add a movie's ranks as a new row. returns the row number
+        '''
+        row = len(self.titles)
+        self.titles.append(movie.title)
+        for column in self.columns.values():
+            column.append(nan)
+        for entry in movie.ranks:
+            column = self.columns.get(entry.source)
+            if column is None:
+                column = self.columns[entry.source] = array('d', [nan]) * (row + 1)
+            column[row] = to_number(entry.rank)
+        return row
+
+    def column(self, source):
+        return self.columns[source]
+
+    @classmethod
+    def from_movies(cls, movies):
+        table = cls()
+        for movie in movies:
+            table.add(movie)
+        return table
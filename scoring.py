@@ -0,0 +1,186 @@
+"""
+rating-aware score for every movie on at least one list, kept as a sorted index.
+
+counting lists ignores the ratings imdb and rotten tomatoes hand us. this scores every movie on
+two things:
+    rating     a bayesian average of each rating source: a movie's score out of 10 is pulled
+               towards that source's mean by prior_votes[source] imaginary votes, so 9.5 from a
+               handful of reviews counts for less than 8.9 from a million. sources a movie has
+               no rating from count as their mean. the sources are then averaged
+    position   the movie's borda total (see aggregate.py) squashed into 0..1, so placing high on
+               a few lists beats scraping onto the bottom of many
+and the score is position_weight of the one plus the rest of the other, between 0 and 1.
+
+scores are kept sorted in data/scores.json, so the top n or everything above a threshold is a
+bisect and a slice. when a movie's ratings or list positions change only that movie is rescored;
+the per-source means are tracked as ratings come and go, and everything is rescored at once only
+when one of them has drifted by more than prior_drift from the value the scores were built on.
+
+usage: python scoring.py [--top N] [--above score]
+"""
+import argparse
+import bisect
+import json
+import os
+
+from store import atomic_write
+
+# where the scores live between runs
+scores_path = 'data/scores.json'
+
+# how many votes a source's mean counts for when it's averaged with a movie's rating
+prior_votes = {
+    'imdb': 25000,
+    'rotten_tomatoes': 50,
+}
+# for any other source that starts handing out ratings
+default_prior_votes = 10
+# how much of the score comes from list positions rather than ratings
+position_weight = 0.5
+# the borda total at which position is worth half its weight
+position_prior = 2.0
+# how far (out of 10) a source's mean can move before every movie gets rescored with the new one
+prior_drift = 0.05
+
+
+def bayesian(score, votes, mean, prior):
+    '''
+    score out of 10 from votes, shrunk towards mean as if it had another prior votes at mean
+    '''
+    return (score * votes + mean * prior) / (votes + prior)
+
+
+class Scores:
+    '''
+    movie -> score, sorted best first. feed it with update() as ratings and list positions change
+    '''
+
+    def __init__(self, path=scores_path):
+        self.path = path
+        # movie -> {'ratings': {source: [score, votes]}, 'borda': total, 'score': score}
+        self.movies = {}
+        # source -> [sum of scores, how many] over every movie, for the running mean
+        self.sums = {}
+        # source -> the mean the current scores were computed with
+        self.means = {}
+        if os.path.exists(path):
+            with open(path, 'r') as scores_file:
+                state = json.loads(scores_file.read())
+            self.movies = state['movies']
+            self.sums = state['sums']
+            self.means = state['means']
+        # sorted list of (-score, movie). the file is saved in this order, so this sort is linear
+        self._sorted = sorted((-entry['score'], movie) for movie, entry in self.movies.items())
+
+    def mean(self, source):
+        total, count = self.sums.get(source, (0.0, 0))
+        return total / count if count else None
+
+    def score(self, entry):
+        rating = 0.0
+        if self.means:
+            for source, mean in self.means.items():
+                prior = prior_votes.get(source, default_prior_votes)
+                score, votes = entry['ratings'].get(source, (mean, 0))
+                rating += bayesian(score, votes, mean, prior)
+            rating /= len(self.means)
+        position = entry['borda'] / (entry['borda'] + position_prior)
+        return position_weight * position + (1 - position_weight) * rating / 10
+
+    def update(self, movie, ratings, borda):
+        '''
+        set a movie's ratings (records.Rating's) and borda total, and rescore it.
+        a borda of None means it isn't on any list, so it's dropped.
+        returns whether anything about it changed
+        '''
+        old = self.movies.get(movie)
+        new = None
+        if borda is not None:
+            new = {
+                'ratings': {
+                    rating.source: [rating.score, rating.reviews or 0]
+                    for rating in ratings if rating.score is not None
+                },
+                'borda': borda,
+            }
+            if old is not None and old['ratings'] == new['ratings'] and old['borda'] == borda:
+                return False
+        self._track(old, -1)
+        self._track(new, 1)
+        if new is not None:
+            new['score'] = self.score(new)
+        self._place(movie, old, new)
+        return True
+
+    def _track(self, entry, sign):
+        # keep each source's running mean up to date
+        if entry is None:
+            return
+        for source, (score, _) in entry['ratings'].items():
+            sums = self.sums.setdefault(source, [0.0, 0])
+            sums[0] += sign * score
+            sums[1] += sign
+
+    def _place(self, movie, old, new):
+        if old is not None:
+            del self._sorted[bisect.bisect_left(self._sorted, (-old['score'], movie))]
+        if new is not None:
+            bisect.insort(self._sorted, (-new['score'], movie))
+            self.movies[movie] = new
+        else:
+            self.movies.pop(movie, None)
+
+    def settle(self):
+        '''
+        call after a batch of update()s: if any source's mean has drifted (or a source came or went)
+        everything is rescored with the new means. returns whether it was
+        '''
+        for source in self.sums.keys() | self.means.keys():
+            mean = self.mean(source)
+            used = self.means.get(source)
+            if mean is None or used is None or abs(mean - used) > prior_drift:
+                self.rescore()
+                return True
+        return False
+
+    def rescore(self):
+        '''
+        recompute every score with the current means (only needed when they've drifted)
+        '''
+        self.means = {source: self.mean(source) for source in self.sums if self.mean(source) is not None}
+        self.sums = {source: self.sums[source] for source in self.means}
+        for entry in self.movies.values():
+            entry['score'] = self.score(entry)
+        self._sorted = sorted((-entry['score'], movie) for movie, entry in self.movies.items())
+
+    def top(self, n=None):
+        '''
+        (movie, score) pairs, best first
+        '''
+        ranking = self._sorted if n is None else self._sorted[:n]
+        return [(movie, -score) for score, movie in ranking]
+
+    def above(self, threshold):
+        '''
+        (movie, score) pairs for every movie scoring at least threshold, best first
+        '''
+        end = bisect.bisect_right(self._sorted, -threshold, key=lambda item: item[0])
+        return [(movie, -score) for score, movie in self._sorted[:end]]
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        movies = {movie: self.movies[movie] for _, movie in self._sorted}
+        atomic_write(self.path, json.dumps({'means': self.means, 'sums': self.sums, 'movies': movies}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='movies by rating-aware score')
+    parser.add_argument('--top', type=int, default=100, help='how many movies to show')
+    parser.add_argument('--above', type=float, help='every movie scoring at least this instead')
+    args = parser.parse_args()
+    scores = Scores()
+    ranked = scores.above(args.above) if args.above is not None else scores.top(args.top)
+    for position, (movie, score) in enumerate(ranked, 1):
+        print(f'{position}. {movie} ({score:.4f})')
@@ -0,0 +1,247 @@
+"""
+compact binary snapshot of the whole movie corpus.
+
+loading the corpus the normal way means parsing every json file in data/movies/. a snapshot is one
+file with everything the ranking and query tools need (titles, years, every source's ranks, ratings,
+review counts and gross) laid out as fixed-width numeric columns plus a string table, so opening it
+is just an mmap: nothing gets parsed, the numeric columns are handed to numpy as-is, and processes
+that open the same snapshot share its pages.
+
+layout (little endian, every section starts on an 8 byte boundary):
+    header           magic, version, movie count, source count, rating source count, string bytes
+    string offsets   int64 x (strings + 1); the strings are the titles, then the sources,
+                     then the rating sources
+    string data      utf-8
+    years            int32 x movies (0 when the title has no year)
+    gross            float64 x movies (nan when unknown)
+    ranks            float64 x movies, once per source (nan when the movie isn't on the list)
+    scores           float64 x movies, once per rating source (nan when unrated)
+    reviews          float64 x movies, once per rating source
+
+usage:
+    python snapshot.py export [data/movies.snap]            snapshot the movie store
+    python snapshot.py import [data/movies.snap]            merge a snapshot back into the store
+"""
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+from matcher import split_year
+from records import Movie, RankEntry, Rating, RankTable
+from store import atomic_write
+
+# where list-maker keeps the snapshot of the current corpus
+snapshot_path = 'data/movies.snap'
+
+magic = b'TOP100SN'
+version = 1
+header = struct.Struct('<8sIIIIQ')
+
+
+def padded(size):
+    return (size + 7) & ~7
+
+
+def write_snapshot(movies, path=snapshot_path):
+    '''
+    write records.Movie's to a snapshot at path. returns how many movies were written
+    '''
+    movies = list(movies)
+    table = RankTable.from_movies(movies)
+    sources = list(table.columns)
+    rating_sources = {}
+    for movie in movies:
+        for rating in movie.ratings:
+            rating_sources.setdefault(rating.source, len(rating_sources))
+    count = len(movies)
+
+    strings = [title.encode('utf-8') for title in table.titles]
+    strings += [name.encode('utf-8') for name in sources + list(rating_sources)]
+    offsets = np.zeros(len(strings) + 1, dtype='<i8')
+    np.cumsum([len(s) for s in strings], out=offsets[1:])
+    string_data = b''.join(strings)
+
+    years = np.zeros(count, dtype='<i4')
+    gross = np.full(count, np.nan, dtype='<f8')
+    scores = np.full((len(rating_sources), count), np.nan, dtype='<f8')
+    reviews = np.zeros((len(rating_sources), count), dtype='<f8')
+    for row, movie in enumerate(movies):
+        year = split_year(movie.title)[1]
+        if year is not None:
+            years[row] = year
+        if movie.fields.get('gross') is not None:
+            gross[row] = movie.fields['gross']
+        for rating in movie.ratings:
+            col = rating_sources[rating.source]
+            if rating.score is not None:
+                scores[col, row] = rating.score
+            if rating.reviews is not None:
+                reviews[col, row] = rating.reviews
+
+    parts = [
+        header.pack(magic, version, count, len(sources), len(rating_sources), len(string_data)),
+        offsets.tobytes(),
+        string_data,
+        years.tobytes(),
+        gross.tobytes(),
+        b''.join(column.tobytes() for column in table.columns.values()),
+        scores.tobytes(),
+        reviews.tobytes(),
+    ]
+    out = bytearray()
+    for part in parts:
+        out += part
+        out += bytes(padded(len(out)) - len(out))
+    atomic_write(path, bytes(out))
+    return count
+
+
+class StringTable:
+    '''
+    a read-only list of the strings in a snapshot, decoded only when they're asked for
+    '''
+
+    def __init__(self, data, offsets, start, stop):
+        self.data = data
+        self.offsets = offsets
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        i = self.start + index
+        return str(self.data[int(self.offsets[i]):int(self.offsets[i + 1])], 'utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class Snapshot:
+    '''
+    an mmap'd snapshot. the numeric columns are numpy views straight onto the file:
+        years (movies), gross (movies), ranks (movies x sources),
+        scores and reviews (movies x rating sources)
+    '''
+
+    def __init__(self, path=snapshot_path):
+        self.path = path
+        with open(path, 'rb') as snapshot_file:
+            self.map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self.map)
+        file_magic, file_version, count, source_count, rating_count, string_bytes = \
+            header.unpack_from(buffer)
+        if file_magic != magic or file_version != version:
+            raise ValueError(f'{path} is not a version {version} movie snapshot')
+        self.count = count
+        offset = padded(header.size)
+
+        def column(dtype, length):
+            nonlocal offset
+            array = np.frombuffer(buffer, dtype=dtype, count=length, offset=offset)
+            offset = padded(offset + array.nbytes)
+            return array
+
+        string_count = count + source_count + rating_count
+        offsets = column('<i8', string_count + 1)
+        strings = buffer[offset:offset + string_bytes]
+        offset = padded(offset + string_bytes)
+        self.titles = StringTable(strings, offsets, 0, count)
+        self.sources = list(StringTable(strings, offsets, count, count + source_count))
+        self.rating_sources = list(StringTable(strings, offsets, count + source_count, string_count))
+        self.years = column('<i4', count)
+        self.gross = column('<f8', count)
+        # stored a source at a time, so transposing gives movies x sources without a copy
+        self.ranks = column('<f8', count * source_count).reshape(source_count, count).T
+        self.scores = column('<f8', count * rating_count).reshape(rating_count, count).T
+        self.reviews = column('<f8', count * rating_count).reshape(rating_count, count).T
+        self._rows = None
+
+    def __len__(self):
+        return self.count
+
+    def row(self, title):
+        '''
+        the row a display title is on, or None
+        '''
+        if self._rows is None:
+            self._rows = {title: row for row, title in enumerate(self.titles)}
+        return self._rows.get(title)
+
+    def movie(self, row):
+        '''
+        rebuild one row as a records.Movie. ranks come back as numbers, even the ones
+        a site gave as strings
+        '''
+        ranks = [
+            RankEntry(source, int(rank) if rank.is_integer() else float(rank))
+            for source, rank in zip(self.sources, self.ranks[row].tolist()) if rank == rank
+        ]
+        ratings = [
+            Rating(source, score if score == score else None, int(reviews))
+            for source, score, reviews in zip(
+                self.rating_sources, self.scores[row].tolist(), self.reviews[row].tolist())
+            if score == score or reviews
+        ]
+        extra = {}
+        gross = float(self.gross[row])
+        if gross == gross:
+            extra['gross'] = int(gross) if gross.is_integer() else gross
+        return Movie(self.titles[row], ranks=ranks, ratings=ratings, **extra)
+
+    def movies(self):
+        for row in range(self.count):
+            yield self.movie(row)
+
+    def close(self):
+        # numpy views keep the buffer alive, so let them go before closing the map
+        self.ranks = self.scores = self.reviews = self.years = self.gross = None
+        self.titles = None
+        try:
+            self.map.close()
+        except BufferError:
+            # someone still holds a view; the map is freed when they let go of it
+            pass
+
+
+def export_store(store, path=snapshot_path):
+    store.load()
+    return write_snapshot(store.movies.values(), path)
+
+
+def import_store(store, path=snapshot_path):
+    '''
+    merge every movie in a snapshot into store. returns how many movies were merged
+    '''
+    snapshot = Snapshot(path)
+    try:
+        for movie in snapshot.movies():
+            store.merge(movie)
+        return len(snapshot)
+    finally:
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    from store import MovieStore
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'export'):
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[2] if len(sys.argv) > 2 else snapshot_path
+    store = MovieStore()
+    if sys.argv[1] == 'export':
+        count = export_store(store, path)
+    else:
+        count = import_store(store, path)
+        store.flush()
+    print(f'{sys.argv[1]}ed {count} movies')
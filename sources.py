@@ -0,0 +1,398 @@
+"""
+every site list-maker knows how to read.
+
+each source is registered with its url, the headers it needs, and a parser. a parser is a pure
+function: it takes the page's html and hands back a list of (list title, movie data) records,
+where movie data is a records.Movie (or None if there's nothing worth storing). parsers don't
+touch any globals or the disk, so they can run anywhere, including in other processes;
+list-maker merges the records they return in one place.
+
+adding a site is just one more @register'd function in here.
+"""
+from parsing import make_soup, only
+from records import Movie, RankEntry, Rating
+from normalize import find_year, join_year, parse_votes, percent_to_score, split_index, title_case
+
+# all urls
+imdb_url = "https://www.imdb.com/list/ls055592025/?mode=simple"
+hwood_reporter_url = "https://www.hollywoodreporter.com/lists/100-best-films-ever-hollywood-favorites-818512"
+empire_url = "https://www.empireonline.com/movies/features/best-movies-2/"
+rt_url = "https://www.rottentomatoes.com/top/bestofrt/"
+wiki_gross_url = "https://en.wikipedia.org/wiki/List_of_highest-grossing_films"
+afi_url = "https://www.afi.com/afis-100-years-100-movies/"
+timeout_url = "https://www.timeout.com/newyork/movies/best-movies-of-all-time"
+timeout_actors_url = "https://www.timeout.com/newyork/movies/100-best-movies-as-chosen-by-actors"
+binsider_url = "https://www.businessinsider.com/50-best-movies-all-time-critics-2016-10"
+ranker_url = "https://www.ranker.com/crowdranked-list/the-best-movies-of-all-time"
+goodmovies_url = "https://goodmovieslist.com/best-movies/best-250-movies.html"
+
+# most of the sites 403 us without a user agent
+hdr = {'User-Agent': 'Mozilla/5.0'}
+
+# how often the daemon refreshes a source (see list-maker.py --daemon)
+hourly = 60 * 60
+daily = 24 * hourly
+weekly = 7 * daily
+
+# name -> Source, in the order they were registered
+registry = {}
+
+
+class Source:
+    '''
+    one site: where its list lives and how to read it.
+    stream is optional: (tag, class name, item parser) for sources that can be parsed
+    one list item at a time while they download (see streaming.py).
+    interval is how many seconds the daemon waits between refreshes
+    '''
+
+    def __init__(self, name, url, parse, headers=None, stream=None, interval=daily):
+        self.name = name
+        self.url = url
+        self.parse = parse
+        self.headers = headers
+        self.stream = stream
+        self.interval = interval
+
+
+def register(name, url, headers=hdr, stream=None, interval=daily):
+    '''
+    decorator that adds a parser to the registry under name
+    '''
+    def wrap(parse):
+        registry[name] = Source(name, url, parse, headers, stream, interval)
+        return parse
+    return wrap
+
+
+def run_parser(name, page):
+    '''
+    run a registered source's parser on its page. this lives at the top level of the module
+    so a process pool can pickle it
+    '''
+    return registry[name].parse(page)
+
+
+@register('imdb', imdb_url, headers=None, interval=6 * hourly)
+def parse_imdb(page):
+    '''
+    parse the imdb page into (list title, movie data) records
+    '''
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only('div', class_name='lister-list'))
+    # find the list elem ('.lister-list')
+    list_items = soup.find('div', attrs={
+                           'class', 'lister-list'}).find_all('div', attrs={'class', 'lister-item'})
+    # loop thru all items in the list
+    for item in list_items:
+        # get the wrapper of the content data
+        content = item.find('div', attrs={
+                            'class', 'lister-item-content'}).find('div', attrs={'class', 'lister-col-wrapper'})
+        # access the div that contains the title
+        header_div = content.find(
+            'div', attrs={'class', 'col-title'}).find('span')
+        # access the div that contains the movie's IMDB rating
+        rating_div = content.select_one('.col-imdb-rating')
+        movie_rating = rating_div.text.strip()
+        # convert rating into a float
+        movie_rating = float(movie_rating)
+        # access the number of ratings
+        num_reviews = rating_div.select_one('strong')['title']
+        # at this point, num_reviews is formatted like this:
+        # 9.2 base on 1,512,511 votes
+        # we need to extract the 1,512,511
+        num_reviews = parse_votes(num_reviews, movie_rating)
+
+        # get all parts in the header_div
+        header_elems = header_div.find_all('span')
+        # access the movies rank in the list, convert to int, and strip the trailing .
+        movie_index = int(header_elems[0].text.strip('.'))
+        # finally, get the movie's title (just kidding, this is ANOTHER WRAPPER)
+        title_div = header_elems[1]
+        # there's two elements in this; the movie's title and the year it was released. we want both.
+        movie_title = title_div.find('a').text.strip()
+        # get movie year
+        movie_year = title_div.find('span').text.strip()
+        # add year to the movie title
+        display_title = join_year(movie_title, movie_year)
+        # construct moviedata
+        movie_data = Movie(
+            display_title,
+            ranks=[RankEntry('imdb', movie_index)],
+            ratings=[Rating('imdb', movie_rating, num_reviews)]
+        )
+        # FINALLY, add the movie to the list
+        records.append((display_title, movie_data))
+    return records
+
+
+# the magazine lists are articles; they only change when someone edits them
+@register('hollywood_reporter', hwood_reporter_url, interval=weekly)
+def parse_hwood_reporter(page):
+    '''
+    parse the hollywood reporter page into (list title, movie data) records
+    '''
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only('ol'))
+    # find the list elem ol.list--ordered__items
+    list_items = soup.find('ol').find_all('li')
+    # loop thru all items in the list
+    for item in list_items:
+        # get the bodygroup (not used yet)
+        body_div = item.find('div')
+
+        # get the headergroup
+        header_div = item.find('header')
+        # grab the movie's rank
+        movie_index = header_div.select_one('.list-item__index').text
+        movie_index = int(movie_index)
+        # the only h1 in this div is the title
+        movie_title = header_div.find('h1').text.strip()
+        # the only h2 is the year
+        movie_year = header_div.find('h2').text.strip()
+        # combine year + title to get the full name
+        display_title = join_year(movie_title, movie_year)
+        # construct moviedata
+        movie_data = Movie(display_title, ranks=[RankEntry('hollywood_reporter', int(movie_index))])
+        records.append((display_title, movie_data))
+    return records
+
+
+@register('empire', empire_url, interval=weekly)
+def parse_empire(page):
+    '''
+    parse the empire page into (list title, movie data) records
+    '''
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only('div', class_name='article__content'))
+    # by far the most poorly organized page.
+    container = soup.find('div', attrs={'class', 'article__content'})
+    # everything is just on the same level
+    title_divs = container.find_all('h2')
+    for item in title_divs:
+        # parse text from the item
+        text = item.text
+        # no organization at all!! so we have to split by a . and then re-join the content
+        movie_index, movie_title = split_index(text)
+        # parse movie year from movie_title
+        movie_year = movie_title.split(' ')[-1].strip()
+        # remove movie year from movie_title
+        movie_title = movie_title.strip(movie_year).strip()
+        # yes, i realize that i just removed the year from the title. later on, this will (probably) be useful.
+        display_title = join_year(movie_title, movie_year)
+        # construct moviedata
+        movie_data = Movie(display_title, ranks=[RankEntry('empire', int(movie_index))])
+        records.append((display_title, movie_data))
+    return records
+
+
+def parse_tomatoes_item(item, index):
+    '''
+    parse one row of the rotten tomatoes table into a record (None if it isn't a movie)
+    '''
+    # each row is split into 4 parts; the index, rating, title, and # of ratings
+    row_parts = item.find_all('td')
+    # if the row has less than 4 items, it's not part of the movie list so we should ignore it
+    if len(row_parts) < 4:
+        return None
+    # grab the index
+    movie_index = row_parts[0].text.strip('.')
+    # we need to convert this from a percentage to a decimal
+    movie_rating = percent_to_score(row_parts[1].text)
+    # this is already formatted how we want to display it
+    display_title = row_parts[2].text.strip()
+    num_reviews = int(row_parts[3].text)
+    # movie_title contains the year in the title, so we need to split that up
+    movie_year = display_title.split(' ')[-1].strip()
+    movie_title = display_title.strip(movie_year)
+    # construct moviedata
+    movie_data = Movie(
+        display_title,
+        ranks=[RankEntry('rotten_tomatoes', int(movie_index))],
+        ratings=[Rating('rotten_tomatoes', movie_rating, num_reviews)]
+    )
+    return display_title, movie_data
+
+
+# the rt page only has the one table, so every row is fair game when streaming
+@register('rotten_tomatoes', rt_url, stream=('tr', None, parse_tomatoes_item), interval=hourly)
+def parse_tomatoes(page):
+    '''
+    parse the rotten tomatoes page into (list title, movie data) records
+    '''
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only('table', class_name='table'))
+    # nice! the whole list is just in a table!
+    table = soup.find('table', attrs={'class': 'table'})
+    table_rows = table.find_all('tr')
+    for index, item in enumerate(table_rows):
+        record = parse_tomatoes_item(item, index)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+@register('wiki_gross', wiki_gross_url)
+def parse_wiki_gross(page):
+    '''
+    parse the wiki top grossing films page into (list title, movie data) records
+    '''
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only('table', class_name='wikitable'))
+    # nice! the whole list is just in a table!
+    # table = soup.find('table', attrs={'class': 'wikitable sortable'})
+    table = soup.select_one('table.wikitable.sortable')
+    table_rows = table.find_all('tr')
+    for item in table_rows:
+        # if the first th is "Rank", this is the header row
+        if item.find('th').text.strip() == "Rank":
+            continue
+        # split that bad boi up into cells
+        row_parts = item.find_all('td')
+        movie_index = row_parts[0].text.strip()
+        movie_title = item.find('th').text.strip()
+        movie_year = row_parts[3].text.strip()
+        display_title = join_year(movie_title, f'({movie_year})')
+
+        # wikipedia only gives us the list, there's no movie data worth keeping
+        records.append((title_case(display_title), None))
+    return records
+
+
+@register('afi', afi_url, interval=weekly)
+def parse_afi(page):
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only('label', class_name='container'))
+    list_items = soup.select('label.container > h6.q_title')
+    for item in list_items:
+        # the title is formatted as such: "1. CITIZEN KANE (1941)" so we have to parse it
+        movie_index, movie_title = split_index(item.text)
+        # currently, i feel like the title is yelling at me. that makes me uncomfortable
+        movie_title = title_case(movie_title)
+        movie_data = Movie(movie_title, ranks=[RankEntry('afi', int(movie_index))])
+        records.append((title_case(movie_title), movie_data))
+    return records
+
+
+@register('timeout', timeout_url, interval=weekly)
+def parse_timeout(page):
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only(id='content'))
+    list_items = soup.select(
+        '#content > article > div > div > div > div > div > article > div.card-content > header > h3 > a')
+
+    for index, item in enumerate(list_items[:-1]):
+        movie_title = item.text.strip()
+        movie_data = Movie(movie_title, ranks=[RankEntry('timeout', index+1)])
+        # add that bad boi to the list
+        records.append((title_case(movie_title), movie_data))
+    return records
+
+
+@register('timeout_actors', timeout_actors_url, interval=weekly)
+def parse_timeout_actors(page):
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only(id='content'))
+    list_items = soup.select(
+        '#content > article > div > div > div > div > div > article > div.card-content > header > h3 > a')
+
+    for index, item in enumerate(list_items[:-1]):
+        movie_title = item.text.strip()
+        movie_data = Movie(movie_title, ranks=[RankEntry('timeout_actors', index+1)])
+        # add the movie to its list
+        records.append((title_case(movie_title), movie_data))
+    return records
+
+
+@register('business_insider', binsider_url, interval=weekly)
+def parse_binsider(page):
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only('h2', class_name='slide-title-text'))
+    list_items = soup.select('h2.slide-title-text')
+
+    for item in list_items:
+        # each item is formatted as such:
+        # 1. "Citizen Kane" (1941)
+        # strip the quotes and all whitespace
+        item_text = item.text.strip()
+        movie_index = split_index(item_text)[0]
+        movie_title = item_text.strip(f'{movie_index}. ').replace('"', '')
+        # construct data
+        movie_data = Movie(movie_title, ranks=[RankEntry('business_insider', int(movie_index))])
+        records.append((movie_title, movie_data))
+    return records
+
+
+def parse_ranker_item(item, index):
+    '''
+    parse one .listItem from ranker into a record
+    '''
+    movie_index = item.select_one('.listItem__rank').text.strip()
+    movie_title = item.select_one('.listItem__title').text.strip()
+    # now try to find the year of the movie (embedded ONLY in the description)
+    movie_desc = item.select_one('.listItem__properties').text.strip()
+    # use some fancy regex to select the year
+    movie_year = find_year(movie_desc)
+    # sometimes, they decide to throw the year of production into the title
+    # (because why not), so we need to account for that when adding the year ourselves.
+    movie_title = movie_title.strip(movie_year)
+    movie_title = join_year(movie_title, movie_year)
+    # finally, put together all the movie's data
+    movie_data = Movie(movie_title, ranks=[RankEntry('ranker', movie_index)])
+    return movie_title, movie_data
+
+
+# ranker's list is voted on constantly
+@register('ranker', ranker_url, stream=(None, 'listItem__h2', parse_ranker_item), interval=hourly)
+def parse_ranker(page):
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only(class_name='listItem__h2'))
+    # this one's fun. there's a lot going on in each of the list items,
+    # so we're going to have parse every element out separately.
+
+    # first, select all the containers
+    list_items = soup.select('.listItem.listItem__h2')
+
+    for index, item in enumerate(list_items):
+        record = parse_ranker_item(item, index)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+def parse_goodmovies_item(item, index):
+    '''
+    parse one p.list_movie_name from goodmovies into a record. index is its position on the page
+    '''
+    # the movie index is stored in plaintext inside item,
+    # so we're going to just grab it from enumerate() instead
+    movie_title = item.select_one('.list_movie_localized_name').text
+    movie_year = item.find(
+        'span', attrs={'itemprop': 'datePublished'}).text
+    display_title = join_year(movie_title, f'({movie_year})')
+    # construct moviedata
+    movie_data = Movie(display_title, ranks=[RankEntry('goodmovies', index+1)])
+    return display_title, movie_data
+
+
+@register('goodmovies', goodmovies_url, stream=('p', 'list_movie_name', parse_goodmovies_item))
+def parse_goodmovies(page):
+    records = []
+    # convert the page into a bowl of soup
+    soup = make_soup(page, only('p', class_name='list_movie_name'))
+    list_items = soup.select('p.list_movie_name')
+    for index, item in enumerate(list_items):
+        record = parse_goodmovies_item(item, index)
+        if record is not None:
+            records.append(record)
+    return records
@@ -0,0 +1,197 @@
+"""
+in-memory movie store.
+
+instead of opening, reading, merging and rewriting data/movies/<movie>.json every single time a
+parser finds a movie, the whole corpus is loaded once, every merge happens in memory, and only the
+movies that actually changed get written back at the end of the run.
+
+where the movies end up is pluggable: JsonBackend keeps the original one-file-per-movie layout,
+and db.SqliteBackend keeps the whole corpus in a single sqlite file.
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from normalize import slugify
+from records import Movie
+
+# where every movie's datafile lives
+movies_dir = 'data/movies'
+
+# mkstemp makes files only we can read, but plain open() respects the umask. grab the umask
+# once so flushed files end up with the same permissions the old per-movie writes gave them
+file_umask = os.umask(0)
+os.umask(file_umask)
+
+
+@contextmanager
+def atomic_open(path, mode='w', **kwargs):
+    '''
+    open a temp file next to path for writing; it replaces path only once the with block finishes
+    without an error, so readers only ever see the old file or the new one, never half of one
+    '''
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as tmp_file:
+            yield tmp_file
+        os.chmod(tmp_path, 0o666 & ~file_umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def atomic_write(path, text):
+    '''
+    write text to path all at once (see atomic_open)
+    '''
+    # works for raw bytes too (cached pages and such)
+    with atomic_open(path, 'wb' if isinstance(text, bytes) else 'w') as out_file:
+        out_file.write(text)
+
+
+class JsonBackend:
+    '''
+    the original layout: one json file per movie in data/movies/
+    '''
+
+    def __init__(self, directory=movies_dir):
+        self.directory = directory
+
+    def load(self):
+        '''
+        yield (filename, json text) for every movie on disk
+        '''
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json') or filename.startswith('.tmp-'):
+                continue
+            with open(os.path.join(self.directory, filename), 'r') as movie_file:
+                yield filename, movie_file.read()
+
+    def write(self, records):
+        '''
+        save a list of (filename, data, json text) records
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        for filename, data, text in records:
+            atomic_write(os.path.join(self.directory, filename), text)
+
+    def delete(self, filenames):
+        for filename in filenames:
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                pass
+
+
+class MovieStore:
+    '''
+    holds every movie in memory as a records.Movie, keyed by datafile name.
+    where it actually gets saved is up to the backend (json files by default)
+    '''
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else JsonBackend()
+        # filename -> records.Movie
+        self.movies = {}
+        # filename -> exactly what's saved right now, so unchanged movies can be skipped
+        self.saved = {}
+        # filenames that have been merged into since the last flush
+        self.dirty = set()
+        # filenames that have been renamed away since the last flush
+        self.removed = set()
+        self.loaded = False
+
+    def load(self):
+        '''
+        read the whole corpus into memory (only happens once)
+        '''
+        if self.loaded:
+            return
+        for filename, text in self.backend.load():
+            self.movies[filename] = Movie.from_data(json.loads(text))
+            self.saved[filename] = text
+        self.loaded = True
+
+    def merge(self, movie):
+        '''
+        merge a records.Movie (or a movie 'nary, same format as update_movie_data) into the store
+        '''
+        self.load()
+        if not isinstance(movie, Movie):
+            movie = Movie.from_data(movie)
+        filename = movie.key.filename
+        stored = self.movies.get(filename)
+        if stored is None:
+            # copy it so the caller can't change the stored data out from under us
+            self.movies[filename] = movie.copy()
+        else:
+            stored.merge(movie)
+        self.dirty.add(filename)
+        self.removed.discard(filename)
+        return filename
+
+    def rename(self, old_title, new_title):
+        '''
+        file a movie's data under a new display title, merging it into whatever's there already
+        '''
+        self.load()
+        filename = slugify(old_title)
+        movie = self.movies.pop(filename, None)
+        if movie is None:
+            return
+        self.dirty.discard(filename)
+        self.removed.add(filename)
+        self.merge(movie.retitled(new_title))
+
+    def get(self, movie_title):
+        '''
+        get a movie's data 'nary by its display title, or None if we've never seen it
+        '''
+        self.load()
+        movie = self.movies.get(slugify(movie_title))
+        return movie.to_data() if movie is not None else None
+
+    def movie(self, movie_title):
+        '''
+        the records.Movie for a display title, or None. don't change it; merge() instead
+        '''
+        self.load()
+        return self.movies.get(slugify(movie_title))
+
+    def titles(self):
+        '''
+        every display title in the store, sorted so they always come out in the same order
+        '''
+        self.load()
+        return sorted(movie.title for movie in self.movies.values())
+
+    def flush(self):
+        '''
+        write every changed movie back in one batch, and drop renamed ones.
+        returns how many movies were written or dropped
+        '''
+        records = []
+        for filename in sorted(self.dirty):
+            data = self.movies[filename].to_data()
+            text = json.dumps(data)
+            # merging the same data twice doesn't change anything, so don't touch it
+            if self.saved.get(filename) == text:
+                continue
+            records.append((filename, data, text))
+        if records:
+            self.backend.write(records)
+            for filename, data, text in records:
+                self.saved[filename] = text
+        removed = [filename for filename in sorted(self.removed) if filename in self.saved]
+        if removed:
+            self.backend.delete(removed)
+            for filename in removed:
+                del self.saved[filename]
+        self.dirty.clear()
+        self.removed.clear()
+        return len(records) + len(removed)
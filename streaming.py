@@ -0,0 +1,210 @@
+"""
+streaming, incremental parsing of the big list pages.
+
+normally a parser waits for the whole page to download and only then hands it to BeautifulSoup.
+here the response is read in chunks and fed straight into an incremental HTMLParser, which hands
+back each list item (ranker's .listItem, goodmovies' p.list_movie_name, a table's tr...) the moment
+its closing tag arrives. the item can be parsed while the rest of the page is still on its way.
+
+with a cache (http_cache.ResponseCache) it goes by the same rules as fetcher.fetch: a fresh page, or
+one the site says hasn't changed, is streamed straight out of the cache, and a new one is kept in
+the cache once it's all arrived (so then the whole page is held in memory, not just one item).
+"""
+import codecs
+import queue
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from bs4 import BeautifulSoup
+
+from fetcher import FetchError, HostLimiter, max_workers, per_host_limit, timeout
+
+# how much of the response to read at a time
+chunk_size = 16 * 1024
+# how many finished items can pile up before the downloads wait for the parsers to catch up
+max_pending = 1000
+
+# tags that never get a closing tag
+void_tags = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr'
+}
+
+
+class ItemStreamer(HTMLParser):
+    '''
+    feed() it html a chunk at a time; on_item gets called with the raw html of every
+    element matching tag (any tag if None) and class_name (if given) as soon as that element is complete
+    '''
+
+    def __init__(self, tag, on_item, class_name=None):
+        # keep entities as-is so the captured html is exactly what was on the page
+        super().__init__(convert_charrefs=False)
+        self.tag = tag
+        self.class_name = class_name
+        self.on_item = on_item
+        # open tags inside the item we're capturing (empty when we're not capturing)
+        self.stack = []
+        self.parts = []
+
+    def matches(self, tag, attrs):
+        if self.tag is not None and tag != self.tag:
+            return False
+        if self.class_name is None:
+            return True
+        classes = dict(attrs).get('class') or ''
+        return self.class_name in classes.split()
+
+    def handle_starttag(self, tag, attrs):
+        if not self.stack:
+            if not self.matches(tag, attrs):
+                return
+            self.parts = []
+        self.parts.append(self.get_starttag_text())
+        if tag not in void_tags:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.stack:
+            self.parts.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        # stray closing tags (or ones for tags html lets you leave open) get ignored
+        if tag not in self.stack:
+            return
+        self.parts.append(f'</{tag}>')
+        # closing an outer tag closes everything still open inside it
+        while self.stack.pop() != tag:
+            pass
+        if not self.stack:
+            self.on_item(''.join(self.parts))
+            self.parts = []
+
+    def handle_data(self, data):
+        if self.stack:
+            self.parts.append(data)
+
+    def handle_entityref(self, name):
+        if self.stack:
+            self.parts.append(f'&{name};')
+
+    def handle_charref(self, name):
+        if self.stack:
+            self.parts.append(f'&#{name};')
+
+
+def item_soup(html):
+    '''
+    turn one captured item into a Tag the parsers can work with.
+    html.parser is used on purpose: lxml throws away a <tr> that isn't inside a <table>
+    '''
+    return BeautifulSoup(html, 'html.parser').find(True)
+
+
+def feed_cached(url, tag, on_item, class_name, cache):
+    '''
+    stream a page out of the cache. returns the page
+    '''
+    body = cache.body(url)
+    streamer = ItemStreamer(tag, on_item, class_name)
+    # the cache doesn't keep the charset, but every one of the streamed sites is utf-8
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for start in range(0, len(body), chunk_size):
+        streamer.feed(decoder.decode(body[start:start + chunk_size]))
+    streamer.feed(decoder.decode(b'', final=True))
+    streamer.close()
+    return body
+
+
+def stream_items(url, headers, tag, on_item, class_name=None, limiter=None, cache=None, offline=False):
+    '''
+    download url in chunks, calling on_item(html) for every matching element as it completes.
+    returns the whole page if there's a cache (it's kept there), else None
+    '''
+    headers = dict(headers or {})
+    if cache is not None:
+        entry = cache.get(url)
+        if entry is not None and (offline or cache.fresh(entry)):
+            return feed_cached(url, tag, on_item, class_name, cache)
+        headers.update(cache.validators(url))
+    if offline:
+        raise FetchError(url, 'not in the cache (running offline)')
+    req = Request(url, headers=headers)
+    streamer = ItemStreamer(tag, on_item, class_name)
+    chunks = []
+    # the host limit covers the whole download, not just connecting
+    with limiter(url) if limiter is not None else nullcontext():
+        try:
+            page = urlopen(req, timeout=timeout)
+        except HTTPError as e:
+            # not modified: what's in the cache is still the page
+            if e.code == 304 and cache is not None:
+                cache.revalidated(url)
+                return feed_cached(url, tag, on_item, class_name, cache)
+            raise FetchError(url, e) from e
+        except OSError as e:
+            raise FetchError(url, e) from e
+        with page:
+            charset = page.headers.get_content_charset() or 'utf-8'
+            decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+            while True:
+                try:
+                    chunk = page.read(chunk_size)
+                except OSError as e:
+                    raise FetchError(url, e) from e
+                if not chunk:
+                    break
+                if cache is not None:
+                    chunks.append(chunk)
+                streamer.feed(decoder.decode(chunk))
+            streamer.feed(decoder.decode(b'', final=True))
+            body = None
+            if cache is not None:
+                body = b''.join(chunks)
+                cache.store(url, body, page.headers)
+    streamer.close()
+    return body
+
+
+def stream_all(jobs, workers=max_workers, host_limit=per_host_limit, cache=None, offline=False):
+    '''
+    stream every source in jobs at once.
+    jobs is formatted like so:
+    {
+        "ranker": ("https://www.ranker.com/...", {"User-Agent": "Mozilla/5.0"}, "li", "listItem"),
+        "goodmovies": ("https://goodmovieslist.com/...", None, "p", "list_movie_name")
+    }
+    yields (name, item, page, error) tuples as items finish downloading, from whichever source they
+    came from. item is a Tag; when a source is done, (name, None, page, error) is yielded once, with
+    error set if the download failed partway. page is the whole page, when there's a cache
+    (see stream_items)
+    '''
+    limiter = HostLimiter(host_limit)
+    items = queue.Queue(maxsize=max_pending)
+
+    def worker(name, url, headers, tag, class_name):
+        try:
+            page = stream_items(url, headers, tag, lambda html: items.put((name, html, None, None)),
+                                class_name, limiter, cache, offline)
+            items.put((name, None, page, None))
+        except FetchError as e:
+            items.put((name, None, None, e))
+        except Exception as e:
+            # anything else still has to be reported, or the loop below would wait forever
+            items.put((name, None, None, FetchError(url, e)))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, (url, headers, tag, class_name) in jobs.items():
+            pool.submit(worker, name, url, headers, tag, class_name)
+        remaining = len(jobs)
+        while remaining:
+            name, html, page, error = items.get()
+            if html is None:
+                remaining -= 1
+                yield name, None, page, error
+            else:
+                # the soup is made here, on the consumer's side, so the parsing overlaps the downloads
+                yield name, item_soup(html), None, None